@@ -3,6 +3,7 @@ from flask_pymongo import PyMongo
 from flask_jwt_extended import JWTManager
 from dotenv import load_dotenv
 import os
+from utils.slow_query import SlowQueryListener
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,8 +14,60 @@ app = Flask(__name__)
 app.config["MONGO_URI"] = os.getenv("MONGO_URI")
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
 
+# Maximum accepted request body size in bytes
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024))
+# Body limit of entity imports: 10,000 names of 128 characters, even when sent as \uXXXX escapes
+app.config["IMPORT_MAX_CONTENT_LENGTH"] = int(os.getenv("IMPORT_MAX_CONTENT_LENGTH", 8 * 1024 * 1024))
+
+# Maximum number of threads shared by all requests for concurrent queries
+app.config["FANOUT_MAX_WORKERS"] = int(os.getenv("FANOUT_MAX_WORKERS", 16))
+
+# Profiling output directory, fraction of requests profiled continuously and sampling interval
+app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR", "profiles")
+app.config["PROFILE_SAMPLE_RATE"] = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+app.config["PROFILE_INTERVAL_MS"] = int(os.getenv("PROFILE_INTERVAL_MS", 5))
+
+# Lifetime of stored Idempotency-Key responses and how long a duplicate waits for the first request
+app.config["IDEMPOTENCY_TTL_SECONDS"] = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+app.config["IDEMPOTENCY_WAIT_SECONDS"] = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
+app.config["IDEMPOTENCY_LEASE_SECONDS"] = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", 60))
+
+# Background jobs: items processed per chunk, worker lease duration and idle polling interval
+app.config["JOB_CHUNK_SIZE"] = int(os.getenv("JOB_CHUNK_SIZE", 500))
+app.config["JOB_LEASE_SECONDS"] = int(os.getenv("JOB_LEASE_SECONDS", 60))
+app.config["JOB_POLL_SECONDS"] = float(os.getenv("JOB_POLL_SECONDS", 1))
+
+# Telemetry: readings per ingested batch, buckets per query and retention (0 keeps readings forever)
+app.config["TELEMETRY_MAX_BATCH"] = int(os.getenv("TELEMETRY_MAX_BATCH", 5000))
+# Body limit of telemetry batches: TELEMETRY_MAX_BATCH readings of about 200 bytes each
+app.config["TELEMETRY_MAX_CONTENT_LENGTH"] = int(os.getenv("TELEMETRY_MAX_CONTENT_LENGTH", 1024 * 1024))
+app.config["TELEMETRY_MAX_BUCKETS"] = int(os.getenv("TELEMETRY_MAX_BUCKETS", 2000))
+app.config["TELEMETRY_TTL_SECONDS"] = int(os.getenv("TELEMETRY_TTL_SECONDS", 0))
+
+# Audit log: buffered events, longest wait for buffer space before dropping an event,
+# events per insert_many, flush interval and retention
+app.config["AUDIT_BUFFER_SIZE"] = int(os.getenv("AUDIT_BUFFER_SIZE", 10000))
+app.config["AUDIT_BLOCK_MS"] = int(os.getenv("AUDIT_BLOCK_MS", 5))
+app.config["AUDIT_BATCH_SIZE"] = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+app.config["AUDIT_FLUSH_SECONDS"] = float(os.getenv("AUDIT_FLUSH_SECONDS", 1))
+app.config["AUDIT_TTL_DAYS"] = int(os.getenv("AUDIT_TTL_DAYS", 90))
+
+# Delta sync: age before a write is returned, changes per response and tombstone retention
+app.config["SYNC_SETTLE_SECONDS"] = int(os.getenv("SYNC_SETTLE_SECONDS", 2))
+app.config["SYNC_MAX_CHANGES"] = int(os.getenv("SYNC_MAX_CHANGES", 1000))
+app.config["SYNC_TOMBSTONE_TTL_DAYS"] = int(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", 30))
+
+# Maximum replication lag tolerated for reads sent to secondaries (MongoDB minimum is 90)
+app.config["MONGO_MAX_STALENESS_SECONDS"] = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", 90))
+
+# Log Mongo commands slower than SLOW_QUERY_MS (0 disables), explaining each filter shape
+# at most once every SLOW_QUERY_EXPLAIN_INTERVAL seconds
+app.config["SLOW_QUERY_MS"] = int(os.getenv("SLOW_QUERY_MS", 100))
+app.config["SLOW_QUERY_EXPLAIN_INTERVAL"] = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+slow_query_listener = SlowQueryListener(app.config["SLOW_QUERY_MS"], app.config["SLOW_QUERY_EXPLAIN_INTERVAL"])
+
 # Initialize PyMongo and JWTManager
-mongo = PyMongo(app)
+mongo = PyMongo(app, event_listeners=[slow_query_listener])
 jwt = JWTManager(app)
 
 def create_app():
@@ -22,11 +75,29 @@ def create_app():
     from routes.factory import bp as factory_bp
     from routes.entity import bp as entity_bp
     from routes.admin import bp as admin_bp
+    from routes.telemetry import bp as telemetry_bp, init_telemetry
+    from utils.read_preference import init_read_preference
+    from utils.profiling import init_profiling
+    from utils.slow_query import init_slow_query_log
+    from utils.idempotency import init_idempotency
+    from utils.jobs import init_jobs
+    from utils.audit import init_audit
+    from utils.indexes import init_indexes
 
     app.register_blueprint(auth_bp)
     app.register_blueprint(factory_bp)
     app.register_blueprint(entity_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(telemetry_bp)
+
+    init_read_preference(app)
+    init_profiling(app)
+    init_slow_query_log(app, slow_query_listener, mongo.cx)
+    init_idempotency(app)
+    init_jobs(app)
+    init_telemetry(app)
+    init_audit(app)
+    init_indexes(app)
 
     return app
 
@@ -0,0 +1,13 @@
+"""
+One-off migration setting updated_at on documents written before it was maintained,
+so that the first delta sync returns them. Run it once after deploying delta sync:
+    python backfill_updated_at.py
+"""
+from app import create_app, mongo
+from utils.sync import EPOCH
+
+if __name__ == '__main__':
+    create_app()
+    for collection in (mongo.db.entities, mongo.db.factories):
+        result = collection.update_many({"updated_at": {"$exists": False}}, {"$set": {"updated_at": EPOCH}})
+        print("%s: %d documents backfilled" % (collection.name, result.modified_count))
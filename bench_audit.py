@@ -0,0 +1,37 @@
+"""
+Measure the latency the audit log adds to a write, against a running MongoDB (MONGO_URI), e.g.
+    python bench_audit.py 5000
+It compares a plain insert_one, the same insert followed by a synchronous audit insert,
+and the insert followed by an enqueued audit event.
+"""
+import sys
+import time
+import datetime
+from app import app, mongo
+from utils.audit import audit_log
+
+def measure(label, count, write):
+    start = time.perf_counter()
+    for i in range(count):
+        write(i)
+    elapsed = time.perf_counter() - start
+    print("%-24s %8.1f us/write" % (label, elapsed / count * 1e6))
+
+def event(i):
+    return {"ts": datetime.datetime.utcnow(), "actor": "bench", "action": "create",
+            "collection": "bench", "document_id": None, "changes": {"i": i}, "endpoint": "bench"}
+
+if __name__ == '__main__':
+    count = int(sys.argv[1])
+    collection = mongo.db.bench_audit
+    audit_log.start(app.config)
+
+    measure("insert only", count, lambda i: collection.insert_one({"i": i}))
+    measure("insert + sync audit", count, lambda i: (collection.insert_one({"i": i}),
+                                                     mongo.db.bench_audit_log.insert_one(event(i))))
+    measure("insert + buffered audit", count, lambda i: (collection.insert_one({"i": i}),
+                                                         audit_log.record(event(i))))
+    print(audit_log.stats())
+
+    collection.drop()
+    mongo.db.bench_audit_log.drop()
@@ -0,0 +1,48 @@
+"""
+Load a running server to compare worker models, e.g.
+    WORKER_CLASS=gthread gunicorn -c gunicorn.conf.py wsgi:application
+    python bench_workers.py http://localhost:8000/admin/entities <token> 2000 50
+"""
+import os
+import sys
+import time
+import threading
+import urllib.request
+
+def run(url, token, total, concurrency):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    per_thread = total // concurrency
+
+    def worker():
+        for _ in range(per_thread):
+            req = urllib.request.Request(url, headers={"Authorization": "Bearer " + token})
+            start = time.perf_counter()
+            try:
+                urllib.request.urlopen(req).read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except Exception:
+                with lock:
+                    errors[0] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    latencies.sort()
+    print("worker_class=%s requests=%d errors=%d concurrency=%d" % (
+        os.getenv("WORKER_CLASS", "gthread"), len(latencies), errors[0], concurrency))
+    print("throughput=%.1f req/s" % (len(latencies) / duration))
+    if latencies:
+        print("p50=%.1f ms p99=%.1f ms" % (latencies[len(latencies) // 2] * 1000,
+                                           latencies[int(len(latencies) * 0.99)] * 1000))
+
+if __name__ == '__main__':
+    run(sys.argv[1], sys.argv[2], int(sys.argv[3]), int(sys.argv[4]))
@@ -2,4 +2,31 @@ import os
 
 class Config:
     MONGO_URI = os.getenv("MONGO_URI")
-    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
\ No newline at end of file
+    JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+    MAX_CONTENT_LENGTH = int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024))
+    IMPORT_MAX_CONTENT_LENGTH = int(os.getenv("IMPORT_MAX_CONTENT_LENGTH", 8 * 1024 * 1024))
+    FANOUT_MAX_WORKERS = int(os.getenv("FANOUT_MAX_WORKERS", 16))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+    PROFILE_INTERVAL_MS = int(os.getenv("PROFILE_INTERVAL_MS", 5))
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", 100))
+    SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", 300))
+    IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", 24 * 60 * 60))
+    IDEMPOTENCY_WAIT_SECONDS = int(os.getenv("IDEMPOTENCY_WAIT_SECONDS", 10))
+    IDEMPOTENCY_LEASE_SECONDS = int(os.getenv("IDEMPOTENCY_LEASE_SECONDS", 60))
+    JOB_CHUNK_SIZE = int(os.getenv("JOB_CHUNK_SIZE", 500))
+    JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 60))
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 1))
+    TELEMETRY_MAX_BATCH = int(os.getenv("TELEMETRY_MAX_BATCH", 5000))
+    TELEMETRY_MAX_CONTENT_LENGTH = int(os.getenv("TELEMETRY_MAX_CONTENT_LENGTH", 1024 * 1024))
+    TELEMETRY_MAX_BUCKETS = int(os.getenv("TELEMETRY_MAX_BUCKETS", 2000))
+    TELEMETRY_TTL_SECONDS = int(os.getenv("TELEMETRY_TTL_SECONDS", 0))
+    AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", 10000))
+    AUDIT_BLOCK_MS = int(os.getenv("AUDIT_BLOCK_MS", 5))
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+    AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", 1))
+    AUDIT_TTL_DAYS = int(os.getenv("AUDIT_TTL_DAYS", 90))
+    SYNC_SETTLE_SECONDS = int(os.getenv("SYNC_SETTLE_SECONDS", 2))
+    SYNC_MAX_CHANGES = int(os.getenv("SYNC_MAX_CHANGES", 1000))
+    SYNC_TOMBSTONE_TTL_DAYS = int(os.getenv("SYNC_TOMBSTONE_TTL_DAYS", 30))
+    MONGO_MAX_STALENESS_SECONDS = int(os.getenv("MONGO_MAX_STALENESS_SECONDS", 90))
\ No newline at end of file
@@ -0,0 +1,21 @@
+import os
+import multiprocessing
+
+# Production server configuration, used with: gunicorn -c gunicorn.conf.py wsgi:application
+bind = os.getenv("BIND", "0.0.0.0:8000")
+
+# Worker model: "gthread" (sync workers with a thread pool) or "gevent"
+worker_class = os.getenv("WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv("THREADS", 4))
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 100))
+
+# MongoClient is not fork-safe, so the app (and its client) is loaded in each worker after fork
+preload_app = False
+
+# Recycle workers gracefully after a number of requests, jittered so they do not restart together
+max_requests = int(os.getenv("MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 100))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("TIMEOUT", 30))
+keepalive = int(os.getenv("KEEPALIVE", 5))
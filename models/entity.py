@@ -1,3 +1,4 @@
+import datetime
 from bson import ObjectId
 
 class Entity:
@@ -8,6 +9,8 @@ class Entity:
     def to_dict(self):
         return {
             'name': self.name,
-            'factory_id': self.factory_id
+            'factory_id': self.factory_id,
+            'version': 1,
+            'updated_at': datetime.datetime.utcnow()
         }
 
@@ -1,12 +1,29 @@
+import datetime
+
 class Factory:
-    def __init__(self, name, location, capacity):
+    def __init__(self, name, location, capacity, point=None):
         self.name = name
         self.location = location
         self.capacity = capacity
+        self.point = point
 
     def to_dict(self):
-        return {
+        factory = {
             'name': self.name,
             'location': self.location,
-            'capacity': self.capacity
+            'capacity': self.capacity,
+            'version': 1,
+            'updated_at': datetime.datetime.utcnow()
         }
+        # GeoJSON Point indexed with 2dsphere, only stored when known
+        if self.point:
+            factory['point'] = self.point
+        return factory
+
+def point_to_dict(point):
+    """
+    Convert a stored GeoJSON Point to a plain dict holding only its type and coordinates.
+    """
+    if not point:
+        return None
+    return {"type": point['type'], "coordinates": list(point['coordinates'])}
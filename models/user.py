@@ -1,5 +1,6 @@
 from werkzeug.security import generate_password_hash, check_password_hash
 from bson import ObjectId
+import datetime
 
 class User:
     def __init__(self, username, password, factory_id, is_admin=False):
@@ -16,6 +17,8 @@ class User:
             'username': self.username,
             'password_hash': self.password_hash,
             'factory_id': self.factory_id,
-            'is_admin': self.is_admin 
+            'is_admin': self.is_admin,
+            'version': 1,
+            'updated_at': datetime.datetime.utcnow()
         }
 
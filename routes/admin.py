@@ -1,11 +1,20 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import mongo
-from models.factory import Factory
+from models.factory import Factory, point_to_dict
 from models.entity import Entity
 from bson import ObjectId
 from utils.is_admin import is_admin_user
 from utils.pagination import paginate, get_pagination_params
+from utils.read_preference import read_preference, get_collection, get_session
+from utils.validation import validate_json
+from utils.idempotency import idempotent
+from utils.jobs import enqueue_job, serialize_job
+from utils.versioning import conditional_update, etag_header
+from utils.formats import respond
+from utils.audit import audit, audit_log
+from utils.sync import record_tombstones, record_factory_change
+from utils.loader import load_user, load_factory
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
 
@@ -14,6 +23,8 @@ Factory CRUD operations for admin
 """
 @bp.route('/factories', methods=['POST'])
 @jwt_required()
+@validate_json('factory_create')
+@idempotent
 def create_factory():
     """
     Create a new factory. This route is only accessible by admin users.
@@ -26,15 +37,13 @@ def create_factory():
         if not is_admin:
             return response
 
-        # Validate required fields
-        if not data or not data.get('name') or not data.get('location') or not data.get('capacity'):
-            return jsonify({"ok": False, "message": "Missing data"}), 400
-        
         # Create a new factory object
-        factory = Factory(name=data['name'], location=data['location'], capacity=data['capacity'])
+        factory = Factory(name=data['name'], location=data['location'], capacity=data['capacity'],
+                          point=data.get('point'))
         
         # Insert the new factory into the database
-        mongo.db.factories.insert_one(factory.to_dict())
+        result = mongo.db.factories.insert_one(factory.to_dict(), session=get_session())
+        audit('create', 'factories', result.inserted_id, data)
         
         return jsonify({"ok": True, "message": "Factory created successfully"}), 201
 
@@ -44,6 +53,7 @@ def create_factory():
 
 @bp.route('/factories', methods=['GET'])
 @jwt_required()
+@read_preference('secondaryPreferred')
 def get_factories():
     """
     Get a list of factories with pagination. This route is only accessible by admin users.
@@ -57,36 +67,107 @@ def get_factories():
         # Get pagination parameters
         page, per_page = get_pagination_params()
         
-        # Define the filter for the query (currently empty to get all factories)
+        # Define the filter for the query, optionally restricted to a bounding box
         filter = {}
-        query = mongo.db.factories.find(filter)
-        
-        # Apply pagination to the query
-        pagination = paginate(query, filter, page, per_page)
+        bbox = request.args.get('bbox')
+        if bbox:
+            try:
+                min_lng, min_lat, max_lng, max_lat = [float(value) for value in bbox.split(',')]
+            except ValueError:
+                return jsonify({"ok": False, "message": "Invalid bbox format"}), 400
+            # Polygon edges are geodesic, so the box must have an area and be narrower than
+            # half the globe; boxes crossing the antimeridian have to be split by the client
+            if not (-180 <= min_lng < max_lng <= 180 and -90 <= min_lat < max_lat <= 90):
+                return jsonify({"ok": False, "message": "Invalid bbox coordinates"}), 400
+            if max_lng - min_lng >= 180:
+                return jsonify({"ok": False, "message": "bbox must be less than 180 degrees wide"}), 400
+            filter['point'] = {"$geoWithin": {"$geometry": {
+                "type": "Polygon",
+                "coordinates": [[[min_lng, min_lat], [max_lng, min_lat], [max_lng, max_lat],
+                                 [min_lng, max_lat], [min_lng, min_lat]]]
+            }}}
+
+        # Apply pagination to the query, joining the entity names and shaping the
+        # factories like the response in the database, so they are passed through raw
+        pagination = paginate(get_collection('factories', raw=True), filter, page, per_page, stages=[
+            {"$lookup": {
+                "from": "entities",
+                "localField": "_id",
+                "foreignField": "factory_id",
+                "pipeline": [{"$project": {"_id": 0, "name": 1}}],
+                "as": "entities"
+            }},
+            {"$project": {
+                "_id": 0,
+                "name": 1,
+                "location": 1,
+                "capacity": 1,
+                "point": {"$ifNull": ["$point", None]},
+                "entities": "$entities.name"
+            }}
+        ])
+
+        return respond({
+            "ok": True, 
+            "data": pagination['items'], 
+            "pagination": {
+                "total": pagination['total'],
+                "page": pagination['page'],
+                "per_page": pagination['per_page']
+            }
+        })
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
+
+@bp.route('/factories/near', methods=['GET'])
+@jwt_required()
+@read_preference('secondaryPreferred')
+def get_factories_near():
+    """
+    Get the factories nearest to a point, within max_km, sorted by distance. This route is only accessible by admin users.
+    """
+    try:
+        # Check if the user is an admin
+        is_admin, response = is_admin_user()
+        if not is_admin:
+            return response
+
+        # Get the query parameters
+        lng = request.args.get('lng', type=float)
+        lat = request.args.get('lat', type=float)
+        max_km = request.args.get('max_km', type=float)
+        limit = min(request.args.get('limit', 10, type=int), 100)
+        if lng is None or lat is None or max_km is None:
+            return jsonify({"ok": False, "message": "Missing data"}), 400
+        if not (-180 <= lng <= 180 and -90 <= lat <= 90) or max_km <= 0 or limit <= 0:
+            return jsonify({"ok": False, "message": "Invalid coordinates"}), 400
+
+        # Let the 2dsphere index find and sort the nearest factories
+        pipeline = [
+            {"$geoNear": {
+                "near": {"type": "Point", "coordinates": [lng, lat]},
+                "distanceField": "distance",
+                "maxDistance": max_km * 1000,
+                "spherical": True
+            }},
+            {"$limit": limit},
+            {"$project": {"name": 1, "location": 1, "capacity": 1, "point": 1, "distance": 1}}
+        ]
+        factories = get_collection('factories').aggregate(pipeline, session=get_session())
 
         result = []
-        # Iterate through the paginated factories
-        for factory in pagination['items']:
-            # Find entities related to the current factory
-            entities = mongo.db.entities.find({"factory_id": factory['_id']})
-            factory_entities = [entity['name'] for entity in entities]
-            # Add factory details to the result list
+        for factory in factories:
             result.append({
+                "id": str(factory['_id']),
                 "name": factory['name'],
                 "location": factory['location'],
                 "capacity": factory['capacity'],
-                "entities": factory_entities
+                "point": point_to_dict(factory['point']),
+                "distance_km": factory['distance'] / 1000
             })
 
-        return jsonify({
-            "ok": True, 
-            "data": result, 
-            "pagination": {
-                "total": pagination['total'],
-                "page": pagination['page'],
-                "per_page": pagination['per_page']
-            }
-        }), 200
+        return jsonify({"ok": True, "data": result}), 200
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -104,7 +185,7 @@ def get_factory(factory_id):
             return response
 
         # Find the factory by ID
-        factory = mongo.db.factories.find_one({"_id": ObjectId(factory_id)})
+        factory = load_factory(ObjectId(factory_id))
         if not factory:
             return jsonify({"ok": False, "message": "Factory not found"}), 404
 
@@ -114,15 +195,17 @@ def get_factory(factory_id):
             "data": {
                 "name": factory['name'],
                 "location": factory['location'],
-                "capacity": factory['capacity']
+                "capacity": factory['capacity'],
+                "point": point_to_dict(factory.get('point'))
             }
-        }), 200
+        }), 200, etag_header(factory)
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
 
 @bp.route('/factories/<factory_id>', methods=['PUT'])
 @jwt_required()
+@validate_json('factory_update')
 def update_factory(factory_id):
     """
     Update a specific factory by its ID. This route is only accessible by admin users.
@@ -136,15 +219,15 @@ def update_factory(factory_id):
         if not is_admin:
             return response
 
-        # Find the factory by ID
-        factory = mongo.db.factories.find_one({"_id": ObjectId(factory_id)})
+        # Update the factory if it exists and matches the If-Match version
+        factory = conditional_update(mongo.db.factories, {"_id": ObjectId(factory_id)}, data, session=get_session())
         if not factory:
-            return jsonify({"ok": False, "message": "Factory not found"}), 404
-
-        # Update the factory with the new data
-        mongo.db.factories.update_one({"_id": ObjectId(factory_id)}, {"$set": data})
+            if not mongo.db.factories.find_one({"_id": ObjectId(factory_id)}, {"_id": 1}):
+                return jsonify({"ok": False, "message": "Factory not found"}), 404
+            return jsonify({"ok": False, "message": "Version conflict"}), 412
+        audit('update', 'factories', factory['_id'], data)
 
-        return jsonify({"ok": True, "message": "Factory updated successfully"}), 200
+        return jsonify({"ok": True, "message": "Factory updated successfully"}), 200, etag_header(factory)
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -153,7 +236,7 @@ def update_factory(factory_id):
 @jwt_required()
 def delete_factory(factory_id):
     """
-    Delete a specific factory by its ID along with all related entities and users. 
+    Delete a specific factory by its ID along with all related entities and users in a background job.
     This route is only accessible by admin users.
     """
     try:
@@ -163,24 +246,15 @@ def delete_factory(factory_id):
             return response
 
         # Find the factory by ID
-        factory = mongo.db.factories.find_one({"_id": ObjectId(factory_id)})
+        factory = load_factory(ObjectId(factory_id))
         if not factory:
             return jsonify({"ok": False, "message": "Factory not found"}), 404
 
-        # Delete the factory
-        mongo.db.factories.delete_one({"_id": ObjectId(factory_id)})
+        # Delete the factory, its entities and its user references in a background job
+        job_id = enqueue_job('delete_factory', {"factory_id": factory_id}, session=get_session())
+        audit('delete', 'factories', factory['_id'], {"job_id": job_id})
 
-        # Delete all related entities
-        entities = mongo.db.entities.find({"factory_id": ObjectId(factory_id)})
-        for entity in entities:
-            mongo.db.entities.delete_one({"_id": entity['_id']})
-
-        # Update all related users to remove the factory reference
-        users = mongo.db.users.find({"factory_id": ObjectId(factory_id)})
-        for user in users:
-            mongo.db.users.update_one({"_id": user['_id']}, {"$set": {"factory_id": None}})
-
-        return jsonify({"ok": True, "message": "Factory and all related entities deleted successfully"}), 200
+        return jsonify({"ok": True, "message": "Factory deletion started", "job_id": str(job_id)}), 202
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -191,6 +265,8 @@ Entity CRUD operations for admin
 
 @bp.route('/entities', methods=['POST'])
 @jwt_required()
+@validate_json('entity_create')
+@idempotent
 def create_entity():
     """
     Create a new entity. This route is only accessible by admin users.
@@ -198,8 +274,6 @@ def create_entity():
     try:
         # Get the request data
         data = request.get_json()
-        if not data or not data.get('name') or not data.get('factory_id'):
-            return jsonify({"ok": False, "message": "Missing data"}), 400
 
         # Check if the user is an admin
         is_admin, response = is_admin_user()
@@ -207,21 +281,55 @@ def create_entity():
             return response
 
         # Find the factory by ID
-        factory = mongo.db.factories.find_one({"_id": ObjectId(data['factory_id'])})
+        factory = load_factory(ObjectId(data['factory_id']))
         if not factory:
             return jsonify({"ok": False, "message": "Factory not found"}), 404
 
         # Create the entity
         entity = Entity(name=data['name'], factory_id=data['factory_id'])
-        mongo.db.entities.insert_one(entity.to_dict())
+        result = mongo.db.entities.insert_one(entity.to_dict(), session=get_session())
+        audit('create', 'entities', result.inserted_id, data)
 
         return jsonify({"ok": True, "message": "Entity created successfully"}), 201
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
 
+@bp.route('/entities/import', methods=['POST'])
+@jwt_required()
+@validate_json('entity_import', max_content_length="IMPORT_MAX_CONTENT_LENGTH")
+def import_entities():
+    """
+    Import entities into a factory in a background job. This route is only accessible by admin users.
+    """
+    try:
+        # Get the request data
+        data = request.get_json()
+
+        # Check if the user is an admin
+        is_admin, response = is_admin_user()
+        if not is_admin:
+            return response
+
+        # Find the factory by ID
+        factory = load_factory(ObjectId(data['factory_id']))
+        if not factory:
+            return jsonify({"ok": False, "message": "Factory not found"}), 404
+
+        # Assign the ids up front so the import can be resumed without duplicates
+        entities = [{"_id": ObjectId(), "name": name} for name in data['names']]
+        job_id = enqueue_job('import_entities', {"factory_id": data['factory_id'], "entities": entities},
+                             total=len(entities), session=get_session())
+        audit('import', 'entities', None, {"factory_id": factory['_id'], "count": len(entities), "job_id": job_id})
+
+        return jsonify({"ok": True, "message": "Entity import started", "job_id": str(job_id)}), 202
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
+
 @bp.route('/entities', methods=['GET'])
 @jwt_required()
+@read_preference('secondaryPreferred')
 def get_entities():
     """
     Get a list of all entities with pagination. This route is only accessible by admin users.
@@ -238,23 +346,26 @@ def get_entities():
         # Define the filter for the query
         filter = {}
 
-        # Execute the query with pagination
-        query = mongo.db.entities.find(filter)
-        pagination = paginate(query, filter, page, per_page)
-
-        # Build the result list
-        result = []
-        for entity in pagination['items']:
-            factory = mongo.db.factories.find_one({"_id": entity['factory_id']})
-            if factory:
-                result.append({"name": entity['name'], "factory": factory["name"]})
+        # Execute the query with pagination, joining the factory names in the database.
+        # Entities whose factory no longer exists are left out
+        pagination = paginate(get_collection('entities', raw=True), filter, page, per_page, stages=[
+            {"$lookup": {
+                "from": "factories",
+                "localField": "factory_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"_id": 0, "name": 1}}],
+                "as": "factory"
+            }},
+            {"$unwind": "$factory"},
+            {"$project": {"_id": 0, "name": 1, "factory": "$factory.name"}}
+        ])
 
         # Return the result with pagination information
-        return jsonify({"ok": True, "data": result, "pagination": {
+        return respond({"ok": True, "data": pagination['items'], "pagination": {
             "total": pagination['total'],
             "page": pagination['page'],
             "per_page": pagination['per_page']
-        }}), 200
+        }})
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -277,18 +388,19 @@ def get_entity(entity_id):
             return jsonify({"ok": False, "message": "Entity not found"}), 404
 
         # Find the associated factory for the entity
-        factory = mongo.db.factories.find_one({"_id": entity['factory_id']})
+        factory = load_factory(entity['factory_id'])
         if not factory:
             return jsonify({"ok": False, "message": "Factory not found"}), 404
 
         # Return the entity and its associated factory details
-        return jsonify({"ok": True, "name": entity['name'], "factory": factory['name']}), 200
+        return jsonify({"ok": True, "name": entity['name'], "factory": factory['name']}), 200, etag_header(entity)
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
 
 @bp.route('/entities/<entity_id>', methods=['PUT'])
 @jwt_required()
+@validate_json('entity_update')
 def update_entity(entity_id):
     """
     Update the details of a specific entity by its ID. This route is only accessible by admin users.
@@ -302,21 +414,22 @@ def update_entity(entity_id):
         if not is_admin:
             return response
 
-        # Find the entity by its ID
-        entity = mongo.db.entities.find_one({"_id": ObjectId(entity_id)})
-        if not entity:
-            return jsonify({"ok": False, "message": "Entity not found"}), 404
-
-        # If factory_id is provided in the data, convert it to ObjectId and validate it
+        # If factory_id is provided in the data, convert it to ObjectId (its format is checked by the schema)
         if 'factory_id' in data:
-            try:
-                data['factory_id'] = ObjectId(data['factory_id'])
-            except Exception:
-                return jsonify({"ok": False, "message": "Invalid factory_id format"}), 400
-
-        # Update the entity with the provided data
-        mongo.db.entities.update_one({"_id": ObjectId(entity_id)}, {"$set": data})
-        return jsonify({"ok": True, "message": "Entity updated successfully"}), 200
+            data['factory_id'] = ObjectId(data['factory_id'])
+
+        # Update the entity if it exists and matches the If-Match version
+        previous = conditional_update(mongo.db.entities, {"_id": ObjectId(entity_id)}, data, session=get_session(),
+                                      previous=True)
+        if not previous:
+            if not mongo.db.entities.find_one({"_id": ObjectId(entity_id)}, {"_id": 1}):
+                return jsonify({"ok": False, "message": "Entity not found"}), 404
+            return jsonify({"ok": False, "message": "Version conflict"}), 412
+        # Moving the entity to another factory removes it from the former factory's syncs
+        record_factory_change('entities', previous, data, session=get_session())
+        audit('update', 'entities', previous['_id'], data)
+        version = previous.get('version', 0) + 1
+        return jsonify({"ok": True, "message": "Entity updated successfully"}), 200, etag_header({"version": version})
 
     except Exception as e:
         # Handle any unexpected errors
@@ -339,8 +452,10 @@ def delete_entity(entity_id):
         if not entity:
             return jsonify({"ok": False, "message": "Entity not found"}), 404
 
-        # Delete the entity
-        mongo.db.entities.delete_one({"_id": ObjectId(entity_id)})
+        # Delete the entity, keeping a tombstone for delta syncs
+        record_tombstones('entities', [entity['_id']], entity['factory_id'], session=get_session())
+        mongo.db.entities.delete_one({"_id": ObjectId(entity_id)}, session=get_session())
+        audit('delete', 'entities', entity['_id'])
         return jsonify({"ok": True, "message": "Entity deleted successfully"}), 200
 
     except Exception as e:
@@ -353,6 +468,7 @@ User CRUD operations for admin
 
 @bp.route('/users', methods=['GET'])
 @jwt_required()
+@read_preference('secondaryPreferred')
 def get_users():
     """
     Retrieve a paginated list of users. This route is only accessible by admin users.
@@ -367,30 +483,69 @@ def get_users():
         page, per_page = get_pagination_params()
         filter = {}
         
-        # Execute the query with pagination
-        query = mongo.db.users.find(filter)
-        pagination = paginate(query, filter, page, per_page)
-
-        result = []
-        # Process each user in the paginated results
-        for user in pagination['items']:
-            factory = mongo.db.factories.find_one({"_id": user.get('factory_id')})
-            result.append({
-                "username": user['username'],
-                "is_admin": user.get('is_admin', False),
-                "factory": factory["name"] if factory else None
-            })
+        # Execute the query with pagination, joining the factory names in the database
+        pagination = paginate(get_collection('users', raw=True), filter, page, per_page, stages=[
+            {"$lookup": {
+                "from": "factories",
+                "localField": "factory_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"_id": 0, "name": 1}}],
+                "as": "factory"
+            }},
+            {"$project": {
+                "_id": 0,
+                "username": 1,
+                "is_admin": {"$ifNull": ["$is_admin", False]},
+                "factory": {"$ifNull": [{"$first": "$factory.name"}, None]}
+            }}
+        ])
 
         # Return the paginated list of users
-        return jsonify({
+        return respond({
             "ok": True, 
-            "data": result, 
+            "data": pagination['items'], 
             "pagination": {
                 "total": pagination['total'],
                 "page": pagination['page'],
                 "per_page": pagination['per_page']
             }
-        }), 200
+        })
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
+
+@bp.route('/users/reassign', methods=['POST'])
+@jwt_required()
+@validate_json('users_reassign')
+def reassign_users():
+    """
+    Move all users of a factory to another factory in a background job. This route is only accessible by admin users.
+    """
+    try:
+        # Get the request data
+        data = request.get_json()
+
+        # Check if the user is an admin
+        is_admin, response = is_admin_user()
+        if not is_admin:
+            return response
+
+        # Check that the target factory exists
+        factory = load_factory(ObjectId(data['to_factory_id']))
+        if not factory:
+            return jsonify({"ok": False, "message": "Factory not found"}), 404
+
+        job_id = enqueue_job('reassign_users', {
+            "from_factory_id": data['from_factory_id'],
+            "to_factory_id": data['to_factory_id']
+        }, session=get_session())
+        audit('reassign', 'users', None, {
+            "from_factory_id": ObjectId(data['from_factory_id']),
+            "to_factory_id": factory['_id'],
+            "job_id": job_id
+        })
+
+        return jsonify({"ok": True, "message": "User reassignment started", "job_id": str(job_id)}), 202
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -408,12 +563,12 @@ def get_user(user_id):
             return response
         
         # Find the user by user_id
-        user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+        user = load_user(ObjectId(user_id))
         if not user:
             return jsonify({"ok": False, "message": "User not found"}), 404
         
         # Find the factory associated with the user
-        factory = mongo.db.factories.find_one({"_id": user.get('factory_id')})
+        factory = load_factory(user.get('factory_id'))
         
         # Return the user details
         return jsonify({
@@ -421,13 +576,14 @@ def get_user(user_id):
             "username": user['username'],
             "is_admin": user.get('is_admin', False),
             "factory": factory["name"] if factory else None
-        }), 200
+        }), 200, etag_header(user)
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
 
 @bp.route('/users/<user_id>', methods=['PUT'])
 @jwt_required()
+@validate_json('user_update')
 def update_user(user_id):
     """
     Update details of a specific user by user_id. This route is only accessible by admin users.
@@ -441,22 +597,19 @@ def update_user(user_id):
         if not is_admin:
             return response
         
-        # Find the user by user_id
-        user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
-        if not user:
-            return jsonify({"ok": False, "message": "User not found"}), 404
-
-        # Validate and convert factory_id if present in the data
-        if 'factory_id' in data:
-            try:
-                data['factory_id'] = ObjectId(data['factory_id'])
-            except:
-                return jsonify({"ok": False, "message": "Invalid factory_id format"}), 400
+        # Convert factory_id if present in the data (its format is checked by the schema)
+        if data.get('factory_id') is not None:
+            data['factory_id'] = ObjectId(data['factory_id'])
 
-        # Update the user with the new data
-        mongo.db.users.update_one({"_id": ObjectId(user_id)}, {"$set": data})
+        # Update the user if it exists and matches the If-Match version
+        user = conditional_update(mongo.db.users, {"_id": ObjectId(user_id)}, data, session=get_session())
+        if not user:
+            if not mongo.db.users.find_one({"_id": ObjectId(user_id)}, {"_id": 1}):
+                return jsonify({"ok": False, "message": "User not found"}), 404
+            return jsonify({"ok": False, "message": "Version conflict"}), 412
+        audit('update', 'users', user['_id'], data)
         
-        return jsonify({"ok": True, "message": "User updated successfully"}), 200
+        return jsonify({"ok": True, "message": "User updated successfully"}), 200, etag_header(user)
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -474,18 +627,97 @@ def delete_user(user_id):
             return response
         
         # Find the user by user_id
-        user = mongo.db.users.find_one({"_id": ObjectId(user_id)})
+        user = load_user(ObjectId(user_id))
         if not user:
             return jsonify({"ok": False, "message": "User not found"}), 404
         
         # Delete the user
-        mongo.db.users.delete_one({"_id": ObjectId(user_id)})
+        mongo.db.users.delete_one({"_id": ObjectId(user_id)}, session=get_session())
+        audit('delete', 'users', user['_id'])
         
         return jsonify({"ok": True, "message": "User deleted successfully"}), 200
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
 
+"""
+Background jobs for admin
+"""
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_job(job_id):
+    """
+    Get the status, progress and result of a background job. This route is only accessible by admin users.
+    """
+    try:
+        # Check if the user is an admin
+        is_admin, response = is_admin_user()
+        if not is_admin:
+            return response
+
+        # Find the job by its ID
+        job = mongo.db.jobs.find_one({"_id": ObjectId(job_id)})
+        if not job:
+            return jsonify({"ok": False, "message": "Job not found"}), 404
+
+        return jsonify({"ok": True, "data": serialize_job(job)}), 200
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
+
+"""
+Audit log for admin
+"""
 
+@bp.route('/audit', methods=['GET'])
+@jwt_required()
+@read_preference('secondaryPreferred')
+def get_audit_log():
+    """
+    Get audit events, newest first, with pagination and the audit buffer counters.
+    Events can be filtered by collection, document_id, actor and action. This route is only accessible by admin users.
+    """
+    try:
+        # Check if the user is an admin
+        is_admin, response = is_admin_user()
+        if not is_admin:
+            return response
 
+        # Build the filter from the query parameters
+        page, per_page = get_pagination_params()
+        filter = {}
+        for field in ('collection', 'actor', 'action'):
+            if request.args.get(field):
+                filter[field] = request.args[field]
+        if request.args.get('document_id'):
+            filter['document_id'] = ObjectId(request.args['document_id'])
+
+        pagination = paginate(get_collection('audit_log'), filter, page, per_page, sort=[("ts", -1)])
 
+        result = []
+        for event in pagination['items']:
+            result.append({
+                "ts": event['ts'].isoformat(),
+                "actor": event['actor'],
+                "action": event['action'],
+                "collection": event['collection'],
+                "document_id": str(event['document_id']) if event['document_id'] else None,
+                "changes": {key: str(value) if isinstance(value, ObjectId) else value
+                            for key, value in (event['changes'] or {}).items()},
+                "endpoint": event['endpoint']
+            })
+
+        return jsonify({
+            "ok": True,
+            "data": result,
+            "stats": audit_log.stats(),
+            "pagination": {
+                "total": pagination['total'],
+                "page": pagination['page'],
+                "per_page": pagination['per_page']
+            }
+        }), 200
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -1,15 +1,27 @@
-from flask import Blueprint, request, jsonify
+import datetime
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import mongo
 from models.entity import Entity
+from models.factory import point_to_dict
 from bson import ObjectId
 from utils.pagination import paginate, get_pagination_params
-from models.entity import Entity
+from utils.fanout import gather
+from utils.read_preference import read_preference, get_collection, get_session
+from utils.validation import validate_json
+from utils.idempotency import idempotent
+from utils.versioning import conditional_update, etag_header
+from utils.formats import respond
+from utils.audit import audit
+from utils.sync import record_tombstones, record_factory_change, decode_token, encode_token, after
+from utils.loader import load_user_by_username
 
 bp = Blueprint('entity', __name__, url_prefix='/entities')
 
 @bp.route('/', methods=['POST'])
 @jwt_required()
+@validate_json('entity_create')
+@idempotent
 def create_entity():
     """
     Create a new entity for the authenticated user's factory.
@@ -17,13 +29,8 @@ def create_entity():
     try:
         data = request.get_json()
 
-        # Check if the request data contains both name and factory_id
-        if not data or not data.get('name') or not data.get('factory_id'):
-            return jsonify({"ok": False, "message": "Missing data"}), 400
-
         # Get the current authenticated user's username
-        username = get_jwt_identity()
-        user = mongo.db.users.find_one({"username": username})
+        user = load_user_by_username(get_jwt_identity())
 
         # Check if the user exists in the database
         if not user:
@@ -36,7 +43,8 @@ def create_entity():
 
         # Create a new entity and insert it into the database
         entity = Entity(name=data['name'], factory_id=data['factory_id'])
-        mongo.db.entities.insert_one(entity.to_dict())
+        result = mongo.db.entities.insert_one(entity.to_dict(), session=get_session())
+        audit('create', 'entities', result.inserted_id, data)
         return jsonify({"ok": True, "message": "Entity created successfully"}), 201
     except Exception as e:
         # Handle any unexpected errors
@@ -44,14 +52,14 @@ def create_entity():
 
 @bp.route('/', methods=['GET'])
 @jwt_required()
+@read_preference('secondaryPreferred')
 def get_entity():
     """
     Get entities for the authenticated user's factory with pagination.
     """
     try:
         # Get the current authenticated user's username
-        username = get_jwt_identity()
-        user = mongo.db.users.find_one({"username": username})
+        user = load_user_by_username(get_jwt_identity())
 
         # Check if the user exists in the database
         if not user:
@@ -64,27 +72,149 @@ def get_entity():
         page, per_page = get_pagination_params()
         filter = {"factory_id": user_factory_id}
 
-        # Query the entities collection with pagination
-        query = mongo.db.entities.find(filter)
-        pagination = paginate(query, filter, page, per_page)
-
-        # Get the factory details
-        factory = mongo.db.factories.find_one({"_id": user_factory_id})
-        
-        # Prepare the result list with entity and factory details
-        result = []
-        for entity in pagination['items']:
-            result.append({"name": entity['name'], "factory": factory['name']})
+        # Query the entities page and its count concurrently. The page joins the factory name
+        # and is shaped like the response in the database, so it is passed through raw
+        pagination = paginate(get_collection('entities', raw=True), filter, page, per_page, stages=[
+            {"$lookup": {
+                "from": "factories",
+                "localField": "factory_id",
+                "foreignField": "_id",
+                "pipeline": [{"$project": {"_id": 0, "name": 1}}],
+                "as": "factory"
+            }},
+            {"$project": {
+                "_id": 0,
+                # The id and version a client needs to send a conditional PUT /entities/<id>
+                "id": {"$toString": "$_id"},
+                "name": 1,
+                "version": {"$ifNull": ["$version", 0]},
+                "factory": {"$ifNull": [{"$first": "$factory.name"}, None]}
+            }}
+        ])
 
         # Return the paginated entities along with pagination metadata
-        return jsonify({
+        return respond({
             "ok": True, 
-            "data": result, 
+            "data": pagination['items'], 
             "pagination": {
                 "total": pagination['total'],
                 "page": pagination['page'],
                 "per_page": pagination['per_page']
             }
+        })
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
+
+def factory_deleted(factory_id):
+    """
+    Terminal answer of a sync whose factory no longer exists: the client drops everything it synced.
+    """
+    return jsonify({
+        "ok": False,
+        "message": "Factory deleted, discard the synced data",
+        "deleted": [{"collection": "factories", "id": str(factory_id)}]
+    }), 410
+
+@bp.route('/changes', methods=['GET'])
+@jwt_required()
+def get_changes():
+    """
+    Get the entities, deletions and factory changes of the authenticated user's factory since a sync token.
+    Without a token, every entity is returned. Follow next_token while has_more is true.
+    Served from the primary: a lagging secondary could miss writes older than the settle horizon,
+    and the token would then move past them for good.
+    """
+    try:
+        # Get the current authenticated user's username
+        user = load_user_by_username(get_jwt_identity())
+
+        # Check if the user exists in the database
+        if not user:
+            return jsonify({"ok": False, "message": "User not found"}), 404
+
+        # Decode the position of the previous sync
+        since = request.args.get('since')
+        try:
+            position = decode_token(since)
+        except ValueError:
+            return jsonify({"ok": False, "message": "Invalid sync token"}), 400
+
+        # A token only holds positions in the factory it was issued for. When the user was moved to
+        # another factory, or the factory was deleted, the client has to drop what it synced
+        user_factory_id = user.get('factory_id')
+        if since and position['factory_id'] != user_factory_id:
+            if position['factory_id'] and not mongo.db.factories.find_one({"_id": position['factory_id']}, {"_id": 1}):
+                return factory_deleted(position['factory_id'])
+            return jsonify({"ok": False, "message": "Factory changed, sync from scratch"}), 410
+        if not user_factory_id:
+            return jsonify({"ok": False, "message": "Not Auth"}), 401
+
+        # Tombstones older than their retention may be gone, so the client has to sync from scratch
+        now = datetime.datetime.utcnow()
+        retention = datetime.timedelta(days=current_app.config["SYNC_TOMBSTONE_TTL_DAYS"])
+        if since and position['tombstones'][0] < now - retention:
+            return jsonify({"ok": False, "message": "Sync token expired, sync from scratch"}), 410
+
+        # Only return writes old enough to be committed, so none is skipped by the next token.
+        # The settle time also has to cover the clock skew with the servers stamping updated_at
+        horizon = now - datetime.timedelta(seconds=current_app.config["SYNC_SETTLE_SECONDS"])
+        horizon = horizon.replace(microsecond=horizon.microsecond // 1000 * 1000)
+        limit = current_app.config["SYNC_MAX_CHANGES"]
+        order = [("updated_at", 1), ("_id", 1)]
+
+        # Query the changed entities, the tombstones and the factory concurrently
+        entities_filter = dict(after(position['entities'], horizon), factory_id=user_factory_id)
+        tombstones_filter = dict(after(position['tombstones'], horizon), factory_id=user_factory_id)
+        entities_collection = get_collection('entities')
+        tombstones_collection = get_collection('tombstones')
+        factories_collection = get_collection('factories')
+        entities, tombstones, factory = gather(
+            lambda session: list(entities_collection.find(entities_filter, session=session).sort(order).limit(limit)),
+            lambda session: list(tombstones_collection.find(tombstones_filter, session=session).sort(order).limit(limit)),
+            lambda session: factories_collection.find_one({"_id": user_factory_id}, session=session)
+        )
+
+        # The factory is being deleted by a background job that has not detached its users yet
+        if not factory:
+            return factory_deleted(user_factory_id)
+
+        # Advance the positions to the last returned documents, or to the horizon once everything before it was returned
+        for name, items in (('entities', entities), ('tombstones', tombstones)):
+            if len(items) == limit:
+                position[name] = (items[-1]['updated_at'], items[-1]['_id'])
+            else:
+                position[name] = (horizon, ObjectId("0" * 24))
+        # The factory is only returned when it changed since the previous sync
+        if factory.get('updated_at') and position['factory'] < factory['updated_at'] < horizon:
+            position['factory'] = factory['updated_at']
+        else:
+            factory = None
+        position['factory_id'] = user_factory_id
+
+        return jsonify({
+            "ok": True,
+            "data": {
+                "entities": [{
+                    "id": str(entity['_id']),
+                    "name": entity['name'],
+                    "version": entity.get('version', 0),
+                    "updated_at": entity['updated_at'].isoformat()
+                } for entity in entities],
+                "deleted": [{
+                    "collection": tombstone['collection'],
+                    "id": str(tombstone['document_id'])
+                } for tombstone in tombstones],
+                "factory": {
+                    "name": factory['name'],
+                    "location": factory['location'],
+                    "capacity": factory['capacity'],
+                    "point": point_to_dict(factory.get('point')),
+                    "version": factory.get('version', 0)
+                } if factory else None
+            },
+            "next_token": encode_token(position),
+            "has_more": len(entities) == limit or len(tombstones) == limit
         }), 200
     except Exception as e:
         # Handle any unexpected errors
@@ -92,14 +222,14 @@ def get_entity():
 
 @bp.route('/<entity_id>', methods=['PUT'])
 @jwt_required()
+@validate_json('entity_update')
 def update_entity(entity_id):
     """
     Update a specific entity's details.
     """
     try:
         # Get the current authenticated user's username
-        username = get_jwt_identity()
-        user = mongo.db.users.find_one({"username": username})
+        user = load_user_by_username(get_jwt_identity())
 
         # Check if the user exists in the database
         if not user:
@@ -108,28 +238,30 @@ def update_entity(entity_id):
         # Get the user's factory ID
         user_factory_id = user.get('factory_id')
 
-        # Find the entity to be updated
-        entity = mongo.db.entities.find_one({"_id": ObjectId(entity_id)})
-        if not entity:
-            return jsonify({"ok": False, "message": "Entity not found"}), 404
-
-        # Check if the user is authorized to update this entity
-        if not user_factory_id or user_factory_id != entity['factory_id']:
-            return jsonify({"ok": False, "message": "Not Auth"}), 401
-
         # Get the updated data from the request
         data = request.get_json()
         
-        # Validate and convert factory_id if present in the updated data
+        # Convert factory_id if present in the updated data (its format is checked by the schema)
         if 'factory_id' in data:
-            try:
-                data['factory_id'] = ObjectId(data['factory_id'])
-            except:
-                return jsonify({"ok": False, "message": "Invalid factory_id format"}), 400
+            data['factory_id'] = ObjectId(data['factory_id'])
         
-        # Update the entity in the database
-        mongo.db.entities.update_one({"_id": ObjectId(entity_id)}, {"$set": data})
-        return jsonify({"ok": True, "message": "Entity updated successfully"}), 200
+        # Update the entity if it exists, belongs to the user's factory and matches the If-Match version
+        filter = {"_id": ObjectId(entity_id), "factory_id": user_factory_id}
+        previous = conditional_update(mongo.db.entities, filter, data, session=get_session(),
+                                      previous=True) if user_factory_id else None
+        if not previous:
+            # Find out why nothing was updated
+            existing = mongo.db.entities.find_one({"_id": ObjectId(entity_id)}, {"factory_id": 1})
+            if not existing:
+                return jsonify({"ok": False, "message": "Entity not found"}), 404
+            if not user_factory_id or user_factory_id != existing['factory_id']:
+                return jsonify({"ok": False, "message": "Not Auth"}), 401
+            return jsonify({"ok": False, "message": "Version conflict"}), 412
+        # Moving the entity to another factory removes it from the former factory's syncs
+        record_factory_change('entities', previous, data, session=get_session())
+        audit('update', 'entities', previous['_id'], data)
+        version = previous.get('version', 0) + 1
+        return jsonify({"ok": True, "message": "Entity updated successfully"}), 200, etag_header({"version": version})
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -142,8 +274,7 @@ def delete_entity(entity_id):
     """
     try:
         # Get the current authenticated user's username
-        username = get_jwt_identity()
-        user = mongo.db.users.find_one({"username": username})
+        user = load_user_by_username(get_jwt_identity())
 
         # Check if the user exists in the database
         if not user:
@@ -161,8 +292,10 @@ def delete_entity(entity_id):
         if not user_factory_id or user_factory_id != entity['factory_id']:
             return jsonify({"ok": False, "message": "Not Auth"}), 401
 
-        # Delete the entity from the database
-        mongo.db.entities.delete_one({"_id": ObjectId(entity_id)})
+        # Delete the entity from the database, keeping a tombstone for delta syncs
+        record_tombstones('entities', [entity['_id']], entity['factory_id'], session=get_session())
+        mongo.db.entities.delete_one({"_id": ObjectId(entity_id)}, session=get_session())
+        audit('delete', 'entities', entity['_id'])
 
         return jsonify({"ok": True, "message": "Entity deleted successfully"}), 200
     except Exception as e:
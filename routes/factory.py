@@ -2,7 +2,15 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import mongo
 from bson import ObjectId
+from models.factory import point_to_dict
 from utils.is_auth import is_auth_for_factory
+from utils.validation import validate_json
+from utils.fanout import gather
+from utils.loader import get_loader, load_user_by_username, load_factory
+from utils.versioning import conditional_update, etag_header
+from utils.audit import audit
+from utils.sync import record_tombstones
+from utils.read_preference import get_session
 
 bp = Blueprint('factory', __name__, url_prefix='/factories')
 
@@ -14,8 +22,7 @@ def get_factories():
     """
     try:
         # Get the current authenticated user's username
-        username = get_jwt_identity()
-        user = mongo.db.users.find_one({"username": username})
+        user = load_user_by_username(get_jwt_identity())
 
         # Check if the user exists in the database
         if not user:
@@ -24,29 +31,39 @@ def get_factories():
         # Get the user's factory ID
         user_factory_id = user.get('factory_id')
 
-        # Find factories and entities associated with the user's factory ID
-        factories = mongo.db.factories.find({"_id": user_factory_id})
-        entities = mongo.db.entities.find({"factory_id": user_factory_id})
+        # Find the factory and entities associated with the user's factory ID concurrently
+        factories = get_loader('factories', '_id')
+        factory, entities = gather(
+            lambda session: factories.load(user_factory_id, session),
+            lambda session: list(mongo.db.entities.find({"factory_id": user_factory_id}, session=session))
+        )
 
         result = []
+        headers = {}
 
         # Construct the result list with factory details and their associated entities
-        for factory in factories:
-            factory_entities = [entity['name'] for entity in entities if entity['factory_id'] == factory['_id']]
+        if factory:
+            factory_entities = [entity['name'] for entity in entities]
             result.append({
+                "id": str(factory['_id']),
+                "version": factory.get('version', 0),
                 "name": factory['name'],
                 "location": factory['location'],
                 "capacity": factory['capacity'],
+                "point": point_to_dict(factory.get('point')),
                 "entities": factory_entities
             })
+            # The ETag to send back as If-Match on PUT /factories/<factory_id>
+            headers = etag_header(factory)
 
-        return jsonify({"ok": True, "data": result}), 200
+        return jsonify({"ok": True, "data": result}), 200, headers
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
 
 @bp.route('/<factory_id>', methods=['PUT'])
 @jwt_required()
+@validate_json('factory_update')
 def update_factory(factory_id):
     """
     Update details of a specific factory.
@@ -60,14 +77,14 @@ def update_factory(factory_id):
         if not is_auth:
             return response
         
-        # Find the factory in the database
-        factory = mongo.db.factories.find_one({"_id": ObjectId(factory_id)})
+        # Update the factory if it exists and matches the If-Match version
+        factory = conditional_update(mongo.db.factories, {"_id": ObjectId(factory_id)}, data, session=get_session())
         if not factory:
-            return jsonify({"ok": False, "message": "Factory not found"}), 404
-        
-        # Update the factory with the new data
-        mongo.db.factories.update_one({"_id": ObjectId(factory_id)}, {"$set": data})
-        return jsonify({"ok": True, "message": "Factory updated successfully"}), 200
+            if not mongo.db.factories.find_one({"_id": ObjectId(factory_id)}, {"_id": 1}):
+                return jsonify({"ok": False, "message": "Factory not found"}), 404
+            return jsonify({"ok": False, "message": "Version conflict"}), 412
+        audit('update', 'factories', factory['_id'], data)
+        return jsonify({"ok": True, "message": "Factory updated successfully"}), 200, etag_header(factory)
     except Exception as e:
         # Handle any unexpected errors
         return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
@@ -80,7 +97,7 @@ def delete_factory(factory_id):
     """
     try:
         # Find the factory in the database
-        factory = mongo.db.factories.find_one({"_id": ObjectId(factory_id)})
+        factory = load_factory(ObjectId(factory_id))
         if not factory:
             return jsonify({"ok": False, "message": "Factory not found"}), 404
 
@@ -89,18 +106,26 @@ def delete_factory(factory_id):
         if not is_auth:
             return response
 
-        # Delete the factory
-        mongo.db.factories.delete_one({"_id": ObjectId(factory_id)})
+        # Delete the factory, keeping a tombstone for delta syncs
+        session = get_session()
+        record_tombstones('factories', [factory['_id']], factory['_id'], session=session)
+        mongo.db.factories.delete_one({"_id": ObjectId(factory_id)}, session=session)
         
-        # Delete all entities related to the factory
-        entities = mongo.db.entities.find({"factory_id": ObjectId(factory_id)})
-        for entity in entities:
-            mongo.db.entities.delete_one({"_id": entity['_id']})
+        # Delete all entities related to the factory, with their tombstones written in a single insert
+        ids = [entity['_id'] for entity in mongo.db.entities.find({"factory_id": factory['_id']}, {"_id": 1},
+                                                                   session=session)]
+        if ids:
+            record_tombstones('entities', ids, factory['_id'], session=session)
+            mongo.db.entities.delete_many({"_id": {"$in": ids}}, session=session)
 
         # Update all users related to the factory
-        users = mongo.db.users.find({"factory_id": ObjectId(factory_id)})
-        for user in users:
-            mongo.db.users.update_one({"_id": user['_id']}, {"$set": {"factory_id": None}})
+        mongo.db.users.update_many({"factory_id": factory['_id']}, {
+            "$set": {"factory_id": None},
+            "$currentDate": {"updated_at": True},
+            "$inc": {"version": 1}
+        }, session=session)
+
+        audit('delete', 'factories', factory['_id'])
 
         return jsonify({"ok": True, "message": "Factory and all related entities deleted successfully"}), 200
     except Exception as e:
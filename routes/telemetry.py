@@ -0,0 +1,181 @@
+import json
+import math
+import datetime
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from pymongo.errors import CollectionInvalid
+from werkzeug.exceptions import RequestEntityTooLarge
+from app import mongo
+from bson import ObjectId
+from utils.loader import load_user_by_username
+from utils.read_preference import read_preference, get_collection, get_session
+from utils.validation import VALIDATORS
+
+bp = Blueprint('telemetry', __name__, url_prefix='/entities')
+
+validate_reading = VALIDATORS['telemetry_reading']
+
+def find_authorized_entity(entity_id):
+    """
+    Find an entity belonging to the authenticated user's factory.
+    Returns (entity, None) or (None, error response).
+    """
+    user = load_user_by_username(get_jwt_identity())
+    if not user:
+        return None, (jsonify({"ok": False, "message": "User not found"}), 404)
+
+    entity = mongo.db.entities.find_one({"_id": ObjectId(entity_id)})
+    if not entity:
+        return None, (jsonify({"ok": False, "message": "Entity not found"}), 404)
+
+    user_factory_id = user.get('factory_id')
+    if not user_factory_id or user_factory_id != entity['factory_id']:
+        return None, (jsonify({"ok": False, "message": "Not Auth"}), 401)
+    return entity, None
+
+def parse_time(value):
+    # Accept epoch seconds or ISO 8601 timestamps, always returned as naive UTC
+    # so that they can be compared and subtracted with each other. Raises ValueError for anything else
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        if not isinstance(value, str):
+            raise ValueError("Invalid timestamp")
+        parsed = datetime.datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+        return parsed
+    if not math.isfinite(seconds):
+        raise ValueError("Invalid timestamp")
+    try:
+        return datetime.datetime.utcfromtimestamp(seconds)
+    except (OverflowError, OSError, ValueError):
+        # e.g. epoch milliseconds sent instead of seconds
+        raise ValueError("Timestamp out of range")
+
+@bp.route('/<entity_id>/telemetry', methods=['POST'])
+@jwt_required()
+def ingest_telemetry(entity_id):
+    """
+    Ingest a batch of readings for an entity, sent as NDJSON (one {"ts", "metric", "value"} per line).
+    """
+    try:
+        # Batches are bounded by their own body limit, sized for TELEMETRY_MAX_BATCH readings
+        request.max_content_length = current_app.config["TELEMETRY_MAX_CONTENT_LENGTH"]
+        if request.content_length is not None and request.content_length > request.max_content_length:
+            return jsonify({"ok": False, "message": "Payload too large"}), 413
+
+        entity, error = find_authorized_entity(entity_id)
+        if error:
+            return error
+
+        # Parse and validate every line before writing anything
+        try:
+            body = request.get_data(as_text=True)
+        except RequestEntityTooLarge:
+            return jsonify({"ok": False, "message": "Payload too large"}), 413
+        lines = [line for line in body.splitlines() if line.strip()]
+        if not lines:
+            return jsonify({"ok": False, "message": "Missing data"}), 400
+        if len(lines) > current_app.config["TELEMETRY_MAX_BATCH"]:
+            return jsonify({"ok": False, "message": "Too many readings"}), 413
+
+        readings = []
+        for number, line in enumerate(lines, 1):
+            try:
+                reading = json.loads(line)
+            except ValueError:
+                return jsonify({"ok": False, "message": "Invalid JSON on line %d" % number}), 400
+            error = validate_reading(reading)
+            if not error:
+                try:
+                    ts = parse_time(reading['ts'])
+                except ValueError:
+                    error = "Invalid ts"
+            if error:
+                return jsonify({"ok": False, "message": "Line %d: %s" % (number, error)}), 400
+            readings.append({
+                "ts": ts,
+                "meta": {
+                    "entity_id": entity['_id'],
+                    "factory_id": entity['factory_id'],
+                    "metric": reading['metric']
+                },
+                "value": reading['value']
+            })
+
+        mongo.db.telemetry.insert_many(readings, ordered=False, session=get_session())
+        return jsonify({"ok": True, "message": "Telemetry ingested successfully", "count": len(readings)}), 201
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
+
+@bp.route('/<entity_id>/telemetry', methods=['GET'])
+@jwt_required()
+@read_preference('secondaryPreferred')
+def get_telemetry(entity_id):
+    """
+    Get min/max/avg of a metric per time bucket over a time range, aggregated by the database.
+    """
+    try:
+        entity, error = find_authorized_entity(entity_id)
+        if error:
+            return error
+
+        # Get the query parameters
+        metric = request.args.get('metric')
+        bucket = request.args.get('bucket', 3600, type=int)
+        if not metric or not request.args.get('start') or not request.args.get('end'):
+            return jsonify({"ok": False, "message": "Missing data"}), 400
+        try:
+            start = parse_time(request.args['start'])
+            end = parse_time(request.args['end'])
+        except ValueError:
+            return jsonify({"ok": False, "message": "Invalid time format"}), 400
+
+        # Bound the number of buckets returned
+        if bucket <= 0 or (end - start).total_seconds() / bucket > current_app.config["TELEMETRY_MAX_BUCKETS"]:
+            return jsonify({"ok": False, "message": "Invalid bucket size"}), 400
+
+        pipeline = [
+            {"$match": {
+                "meta.entity_id": entity['_id'],
+                "meta.metric": metric,
+                "ts": {"$gte": start, "$lt": end}
+            }},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$ts", "unit": "second", "binSize": bucket}},
+                "min": {"$min": "$value"},
+                "max": {"$max": "$value"},
+                "avg": {"$avg": "$value"},
+                "count": {"$sum": 1}
+            }},
+            {"$sort": {"_id": 1}}
+        ]
+        buckets = get_collection('telemetry').aggregate(pipeline, session=get_session())
+
+        result = []
+        for item in buckets:
+            result.append({
+                "ts": item['_id'].isoformat(),
+                "min": item['min'],
+                "max": item['max'],
+                "avg": item['avg'],
+                "count": item['count']
+            })
+
+        return jsonify({"ok": True, "data": result}), 200
+    except Exception as e:
+        # Handle any unexpected errors
+        return jsonify({"ok": False, "message": "An error occurred: " + str(e)}), 500
+
+def init_telemetry(app):
+    # Create the time-series collection on first start
+    options = {"timeseries": {"timeField": "ts", "metaField": "meta", "granularity": "seconds"}}
+    if app.config["TELEMETRY_TTL_SECONDS"]:
+        options["expireAfterSeconds"] = app.config["TELEMETRY_TTL_SECONDS"]
+    try:
+        mongo.db.create_collection("telemetry", **options)
+    except CollectionInvalid:
+        pass
+    mongo.db.telemetry.create_index([("meta.entity_id", 1), ("meta.metric", 1), ("ts", 1)])
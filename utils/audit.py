@@ -0,0 +1,126 @@
+import queue
+import atexit
+import logging
+import datetime
+import threading
+import time
+from flask import request, current_app
+from flask_jwt_extended import get_jwt_identity
+from pymongo import ASCENDING, DESCENDING
+from app import mongo
+
+logger = logging.getLogger('audit')
+
+class AuditLog:
+    """
+    In-process buffer of audit events, flushed to the audit_log collection with insert_many by a
+    background thread. When the buffer is full, callers wait briefly and the event is then dropped and counted.
+    """
+    def __init__(self):
+        self.queue = None
+        self.thread = None
+        self.lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.failed = 0
+
+    def start(self, config):
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.queue = queue.Queue(maxsize=config["AUDIT_BUFFER_SIZE"])
+            self.block_seconds = config["AUDIT_BLOCK_MS"] / 1000.0
+            self.batch_size = config["AUDIT_BATCH_SIZE"]
+            self.flush_seconds = config["AUDIT_FLUSH_SECONDS"]
+            # Started on first use, so every server worker gets its own thread after fork
+            self.thread = threading.Thread(target=self.run, name='audit-flusher', daemon=True)
+            self.thread.start()
+            atexit.register(self.drain)
+
+    def record(self, event):
+        if self.thread is None:
+            self.start(current_app.config)
+        try:
+            self.queue.put(event, timeout=self.block_seconds)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return
+        with self.lock:
+            self.enqueued += 1
+
+    def next_batch(self):
+        # Wait for a first event, then collect more until the batch is full or the flush interval elapses
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def write(self, batch):
+        try:
+            mongo.db.audit_log.insert_many(batch, ordered=False)
+            with self.lock:
+                self.flushed += len(batch)
+        except Exception:
+            logger.exception("Failed to write %d audit events", len(batch))
+            with self.lock:
+                self.failed += len(batch)
+
+    def run(self):
+        while True:
+            self.write(self.next_batch())
+
+    def drain(self):
+        # Write whatever is still buffered when the process exits
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self.write(batch)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "flushed": self.flushed,
+                "failed": self.failed,
+                "buffered": self.queue.qsize() if self.queue else 0
+            }
+
+audit_log = AuditLog()
+
+def audit(action, collection, document_id, changes=None, actor=None):
+    """
+    Record who changed what, without waiting for the write.
+    """
+    if actor is None:
+        try:
+            actor = get_jwt_identity()
+        except RuntimeError:
+            actor = None
+    audit_log.record({
+        "ts": datetime.datetime.utcnow(),
+        "actor": actor,
+        "action": action,
+        "collection": collection,
+        "document_id": document_id,
+        "changes": changes,
+        "endpoint": request.endpoint
+    })
+
+def init_audit(app):
+    # Audit events expire after AUDIT_TTL_DAYS
+    mongo.db.audit_log.create_index("ts", expireAfterSeconds=app.config["AUDIT_TTL_DAYS"] * 24 * 60 * 60)
+    mongo.db.audit_log.create_index([("collection", ASCENDING), ("document_id", ASCENDING), ("ts", DESCENDING)])
@@ -0,0 +1,59 @@
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import current_app
+from app import mongo
+from utils.read_preference import get_session
+from utils.profiling import profiled
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """
+    Get the thread pool shared by all requests, created on first use.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=current_app.config["FANOUT_MAX_WORKERS"],
+                                               thread_name_prefix='fanout')
+    return _executor
+
+def _fork_session(parent):
+    # Sessions cannot be shared between threads, so each task gets its own session
+    # advanced to the request session's times to keep the causal guarantees
+    session = mongo.cx.start_session(causal_consistency=True)
+    if parent.cluster_time is not None:
+        session.advance_cluster_time(parent.cluster_time)
+    if parent.operation_time is not None:
+        session.advance_operation_time(parent.operation_time)
+    return session
+
+def gather(*tasks):
+    """
+    Run independent Mongo operations concurrently and return their results in order.
+    Each task is a callable taking the session it must use for its operations.
+    """
+    parent = get_session()
+    sessions = [_fork_session(parent) for _ in tasks]
+    futures = []
+    try:
+        # Tasks run in a copy of the request context variables (e.g. the endpoint for the slow query log)
+        # and are sampled along with the request thread when the request is profiled
+        for task, session in zip(tasks, sessions):
+            futures.append(get_executor().submit(contextvars.copy_context().run, profiled(task), session))
+    finally:
+        # Let every submitted task finish before touching the sessions, even when one of them
+        # failed, so no sibling is left running on a session that has already been ended
+        wait(futures)
+        for session in sessions:
+            # Carry the latest times back to the request session before discarding the fork
+            if session.cluster_time is not None:
+                parent.advance_cluster_time(session.cluster_time)
+            if session.operation_time is not None:
+                parent.advance_operation_time(session.operation_time)
+            session.end_session()
+    # Re-raises the first failure in task order
+    return [future.result() for future in futures]
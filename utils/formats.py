@@ -0,0 +1,50 @@
+import bson
+from bson.raw_bson import RawBSONDocument
+from flask import request, jsonify, make_response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+BSON = 'application/bson'
+
+def negotiate_format():
+    """
+    Pick the response format from the Accept header. JSON is the default, and MessagePack
+    is only offered when the msgpack package is installed.
+    """
+    offered = [JSON, BSON] + ([MSGPACK] if msgpack else [])
+    return request.accept_mimetypes.best_match(offered, default=JSON)
+
+def decode_raw(value):
+    """
+    Decode the RawBSONDocument values of a payload into plain dicts.
+    """
+    if isinstance(value, RawBSONDocument):
+        return bson.decode(value.raw)
+    if isinstance(value, dict):
+        return {key: decode_raw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_raw(item) for item in value]
+    return value
+
+def respond(payload, status=200):
+    """
+    Encode a response payload in the format negotiated with the client. The payload may hold
+    RawBSONDocument values already shaped like the response, e.g. by an aggregation $project.
+    """
+    mimetype = negotiate_format()
+    if mimetype == JSON:
+        response = make_response(jsonify(decode_raw(payload)), status)
+    elif mimetype == BSON:
+        # RawBSONDocument values are copied into the output as read, without being decoded
+        response = make_response(bson.encode(payload), status)
+        response.mimetype = BSON
+    else:
+        response = make_response(msgpack.packb(decode_raw(payload), default=str), status)
+        response.mimetype = MSGPACK
+    response.vary.add('Accept')
+    return response
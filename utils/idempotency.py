@@ -0,0 +1,114 @@
+import time
+import uuid
+import hashlib
+import datetime
+from functools import wraps
+from flask import request, jsonify, make_response, current_app
+from flask_jwt_extended import get_jwt_identity
+from pymongo.errors import DuplicateKeyError
+from app import mongo
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Interval between checks while a concurrent duplicate is still being processed
+POLL_INTERVAL = 0.05
+
+def _replay(record):
+    response = make_response(record['body'], record['status'])
+    response.mimetype = record['mimetype']
+    response.headers['Idempotent-Replayed'] = 'true'
+    return response
+
+def _lease(now):
+    return now + datetime.timedelta(seconds=current_app.config["IDEMPOTENCY_LEASE_SECONDS"])
+
+def _acquire(records, record_id, fingerprint):
+    """
+    Claim the key for this request. Returns the owner token of the claim, or the
+    response to send instead when another request holds or has answered the key.
+    """
+    owner = uuid.uuid4().hex
+    now = datetime.datetime.utcnow()
+    try:
+        records.insert_one({
+            "_id": record_id,
+            "fingerprint": fingerprint,
+            "status": None,
+            "owner": owner,
+            "locked_until": _lease(now),
+            "created_at": now
+        })
+        return owner, None
+    except DuplicateKeyError:
+        pass
+
+    # Wait for the first request to store its response, then replay it
+    deadline = time.monotonic() + current_app.config["IDEMPOTENCY_WAIT_SECONDS"]
+    while True:
+        record = records.find_one({"_id": record_id})
+        if not record:
+            return None, (jsonify({"ok": False, "message": "Request with this Idempotency-Key failed, retry"}), 409)
+        if record['fingerprint'] != fingerprint:
+            return None, (jsonify({"ok": False, "message": "Idempotency-Key reused with a different payload"}), 422)
+        if record['status'] is not None:
+            return None, _replay(record)
+
+        # The first request's worker died without answering: take the key over once its lease expires
+        now = datetime.datetime.utcnow()
+        locked_until = record.get('locked_until')
+        if locked_until is None or locked_until <= now:
+            taken = records.find_one_and_update(
+                {"_id": record_id, "status": None, "owner": record.get('owner')},
+                {"$set": {"owner": owner, "locked_until": _lease(now)}}
+            )
+            if taken:
+                return owner, None
+            continue
+
+        if time.monotonic() > deadline:
+            return None, (jsonify({"ok": False, "message": "Request with this Idempotency-Key is in progress"}), 409)
+        time.sleep(POLL_INTERVAL)
+
+def idempotent(view):
+    """
+    Route decorator replaying the stored response of a request sent again with the same
+    Idempotency-Key header. Concurrent duplicates wait for the first request instead of writing.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view(*args, **kwargs)
+
+        # Keys are scoped to the user and the endpoint
+        record_id = "%s:%s:%s" % (get_jwt_identity(), request.endpoint, key)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+        records = mongo.db.idempotency_keys
+
+        owner, response = _acquire(records, record_id, fingerprint)
+        if response is not None:
+            return response
+
+        # Only the current owner may answer or release the key, in case its lease was taken over
+        claim = {"_id": record_id, "owner": owner}
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            records.delete_one(claim)
+            raise
+
+        # Server errors are not stored so that the client can retry them
+        if response.status_code >= 500:
+            records.delete_one(claim)
+        else:
+            records.update_one(claim, {"$set": {
+                "status": response.status_code,
+                "body": response.get_data(as_text=True),
+                "mimetype": response.mimetype
+            }})
+        return response
+    return wrapper
+
+def init_idempotency(app):
+    # Stored responses expire after IDEMPOTENCY_TTL_SECONDS
+    mongo.db.idempotency_keys.create_index("created_at", expireAfterSeconds=app.config["IDEMPOTENCY_TTL_SECONDS"])
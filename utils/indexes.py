@@ -0,0 +1,12 @@
+from pymongo import GEOSPHERE, ASCENDING
+from app import mongo
+
+def init_indexes(app):
+    # Nearest-factory and bounding-box queries
+    mongo.db.factories.create_index([("point", GEOSPHERE)])
+
+    # Delta syncs read the changes of a factory in (updated_at, _id) order
+    mongo.db.entities.create_index([("factory_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)])
+    mongo.db.tombstones.create_index([("factory_id", ASCENDING), ("updated_at", ASCENDING), ("_id", ASCENDING)])
+    mongo.db.tombstones.create_index("updated_at",
+                                     expireAfterSeconds=app.config["SYNC_TOMBSTONE_TTL_DAYS"] * 24 * 60 * 60)
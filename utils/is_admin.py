@@ -1,12 +1,15 @@
 from flask import jsonify
 from flask_jwt_extended import get_jwt_identity
-from app import mongo
+from utils.loader import load_user_by_username
+from utils.profiling import profiling_requested, start_profiling
 
 def is_admin_user():
-    username = get_jwt_identity()
-    user = mongo.db.users.find_one({"username": username})
+    user = load_user_by_username(get_jwt_identity())
     if not user:
         return False, jsonify({"ok": False, "message": "User not found"}), 404
     if not user.get('is_admin'):
         return False, jsonify({"ok": False, "message": "Not Auth"}), 401
+    # Admins can opt in to profiling the rest of the request
+    if profiling_requested():
+        start_profiling()
     return True, user
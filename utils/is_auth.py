@@ -1,10 +1,9 @@
 from flask import jsonify
 from flask_jwt_extended import get_jwt_identity
-from app import mongo
+from utils.loader import load_user_by_username
 
 def is_auth_for_factory(factory_id):
-    username = get_jwt_identity()
-    user = mongo.db.users.find_one({"username": username})
+    user = load_user_by_username(get_jwt_identity())
     if not user:
         return False, jsonify({"ok": False, "message": "User not found"}), 404
     user_factory_id = user.get('factory_id')
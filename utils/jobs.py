@@ -0,0 +1,184 @@
+import time
+import uuid
+import signal
+import logging
+import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument, ASCENDING
+from pymongo.errors import BulkWriteError
+from app import app, mongo
+from utils.sync import record_tombstones
+
+logger = logging.getLogger('jobs')
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Job handlers. Each call processes one chunk and returns (progress, done). The progress is saved
+# after every chunk, so a job interrupted by a crash or a restart resumes where it stopped.
+
+def delete_factory_chunk(params, progress, size):
+    factory_id = ObjectId(params['factory_id'])
+
+    # Delete the factory first so it disappears from listings immediately
+    if not progress.get('factory_deleted'):
+        record_tombstones('factories', [factory_id], factory_id)
+        mongo.db.factories.delete_one({"_id": factory_id})
+        progress['factory_deleted'] = True
+        return progress, False
+
+    # Delete the related entities
+    ids = [entity['_id'] for entity in mongo.db.entities.find({"factory_id": factory_id}, {"_id": 1}).limit(size)]
+    if ids:
+        record_tombstones('entities', ids, factory_id)
+        result = mongo.db.entities.delete_many({"_id": {"$in": ids}})
+        progress['entities_deleted'] = progress.get('entities_deleted', 0) + result.deleted_count
+        return progress, False
+
+    # Remove the factory reference from the related users
+    ids = [user['_id'] for user in mongo.db.users.find({"factory_id": factory_id}, {"_id": 1}).limit(size)]
+    if ids:
+        result = mongo.db.users.update_many({"_id": {"$in": ids}}, {
+            "$set": {"factory_id": None},
+            "$currentDate": {"updated_at": True},
+            "$inc": {"version": 1}
+        })
+        progress['users_updated'] = progress.get('users_updated', 0) + result.modified_count
+        return progress, False
+
+    return progress, True
+
+def reassign_users_chunk(params, progress, size):
+    from_factory_id = ObjectId(params['from_factory_id'])
+    to_factory_id = ObjectId(params['to_factory_id'])
+
+    ids = [user['_id'] for user in mongo.db.users.find({"factory_id": from_factory_id}, {"_id": 1}).limit(size)]
+    if not ids:
+        return progress, True
+    result = mongo.db.users.update_many({"_id": {"$in": ids}}, {
+        "$set": {"factory_id": to_factory_id},
+        "$currentDate": {"updated_at": True},
+        "$inc": {"version": 1}
+    })
+    progress['users_updated'] = progress.get('users_updated', 0) + result.modified_count
+    return progress, False
+
+def import_entities_chunk(params, progress, size):
+    offset = progress.get('offset', 0)
+    entities = params['entities'][offset:offset + size]
+    if not entities:
+        return progress, True
+
+    # The _ids are assigned when the job is created, so a chunk replayed after a crash is not duplicated
+    now = datetime.datetime.utcnow()
+    documents = [{"_id": entity['_id'], "name": entity['name'], "factory_id": ObjectId(params['factory_id']),
+                  "version": 1, "updated_at": now}
+                 for entity in entities]
+    try:
+        mongo.db.entities.insert_many(documents, ordered=False)
+    except BulkWriteError as e:
+        if any(error['code'] != DUPLICATE_KEY_ERROR for error in e.details['writeErrors']):
+            raise
+    progress['offset'] = offset + len(entities)
+    return progress, False
+
+HANDLERS = {
+    'delete_factory': delete_factory_chunk,
+    'reassign_users': reassign_users_chunk,
+    'import_entities': import_entities_chunk,
+}
+
+def enqueue_job(job_type, params, total=None, session=None):
+    """
+    Queue a job and return its id.
+    """
+    now = datetime.datetime.utcnow()
+    result = mongo.db.jobs.insert_one({
+        "type": job_type,
+        "params": params,
+        "status": "queued",
+        "progress": {"total": total} if total is not None else {},
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "worker": None,
+        "locked_until": None,
+        "created_at": now,
+        "updated_at": now
+    }, session=session)
+    return result.inserted_id
+
+def claim_job(worker_id):
+    # Take the oldest queued job, or a running job whose worker stopped renewing its lease
+    now = datetime.datetime.utcnow()
+    return mongo.db.jobs.find_one_and_update(
+        {"$or": [{"status": "queued"}, {"status": "running", "locked_until": {"$lt": now}}]},
+        {"$set": {
+            "status": "running",
+            "worker": worker_id,
+            "locked_until": now + datetime.timedelta(seconds=app.config["JOB_LEASE_SECONDS"]),
+            "updated_at": now
+        }, "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def run_job(job, worker_id, should_stop):
+    handler = HANDLERS[job['type']]
+    progress = job['progress']
+    done = False
+    while not done:
+        if should_stop():
+            # Leave the job to be resumed by another worker once the lease expires
+            return
+        try:
+            progress, done = handler(job['params'], progress, app.config["JOB_CHUNK_SIZE"])
+        except Exception as e:
+            logger.exception("Job %s failed", job['_id'])
+            mongo.db.jobs.update_one({"_id": job['_id'], "worker": worker_id}, {"$set": {
+                "status": "failed", "error": str(e), "updated_at": datetime.datetime.utcnow()
+            }})
+            return
+
+        # Save the progress and renew the lease; stop if another worker took the job over
+        now = datetime.datetime.utcnow()
+        update = {
+            "progress": progress,
+            "locked_until": now + datetime.timedelta(seconds=app.config["JOB_LEASE_SECONDS"]),
+            "updated_at": now
+        }
+        if done:
+            update.update({"status": "done", "result": progress})
+        result = mongo.db.jobs.update_one({"_id": job['_id'], "worker": worker_id}, {"$set": update})
+        if result.matched_count == 0:
+            return
+
+def run_worker():
+    """
+    Process jobs until SIGTERM or SIGINT, finishing the current chunk before exiting.
+    """
+    worker_id = uuid.uuid4().hex
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *args: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *args: stopping.append(True))
+
+    while not stopping:
+        job = claim_job(worker_id)
+        if job is None:
+            time.sleep(app.config["JOB_POLL_SECONDS"])
+            continue
+        run_job(job, worker_id, lambda: bool(stopping))
+
+def serialize_job(job):
+    return {
+        "id": str(job['_id']),
+        "type": job['type'],
+        "status": job['status'],
+        "progress": job['progress'],
+        "result": job['result'],
+        "error": job['error'],
+        "created_at": job['created_at'],
+        "updated_at": job['updated_at']
+    }
+
+def init_jobs(app):
+    mongo.db.jobs.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
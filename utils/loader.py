@@ -0,0 +1,81 @@
+import threading
+from flask import g
+from pymongo.read_preferences import Primary
+from app import mongo
+from utils.read_preference import get_collection, get_session
+
+# Collections always loaded from the primary, whatever the route's read preference.
+# Users back authentication and authorization (is_auth_user, is_admin_user), so a stale
+# secondary must never let a deleted or demoted user through.
+PRIMARY_COLLECTIONS = frozenset(['users'])
+
+class Loader:
+    """
+    Request-scoped loader batching lookups on one field into a single $in query
+    and memoizing the documents for the lifetime of the request.
+    """
+    def __init__(self, collection, field):
+        self.collection = collection
+        self.field = field
+        self.cache = {}
+        self.lock = threading.Lock()
+
+    def prime(self, key, document):
+        with self.lock:
+            self.cache[key] = document
+
+    def load_many(self, keys, session=None):
+        keys = list(keys)
+        with self.lock:
+            missing = {key for key in keys if key not in self.cache}
+
+        # None never matches a document, so it does not need a query
+        if None in missing:
+            missing.discard(None)
+            self.prime(None, None)
+
+        if missing:
+            if session is None:
+                session = get_session()
+            documents = self.collection.find({self.field: {"$in": list(missing)}}, session=session)
+            found = {document[self.field]: document for document in documents}
+            with self.lock:
+                for key in missing:
+                    self.cache[key] = found.get(key)
+
+        return [self.cache[key] for key in keys]
+
+    def load(self, key, session=None):
+        return self.load_many([key], session)[0]
+
+def get_loader(collection_name, field):
+    """
+    Get the loader of the current request for a collection field. Loaders must be created
+    in the request thread, but can then be used from fan-out tasks with their own session.
+    Loaders on PRIMARY_COLLECTIONS ignore the route's read preference.
+    """
+    if 'loaders' not in g:
+        g.loaders = {}
+    key = (collection_name, field)
+    if key not in g.loaders:
+        if collection_name in PRIMARY_COLLECTIONS:
+            collection = mongo.db.get_collection(collection_name, read_preference=Primary())
+        else:
+            collection = get_collection(collection_name)
+        g.loaders[key] = Loader(collection, field)
+    return g.loaders[key]
+
+def load_user_by_username(username):
+    user = get_loader('users', 'username').load(username)
+    if user:
+        get_loader('users', '_id').prime(user['_id'], user)
+    return user
+
+def load_user(user_id):
+    user = get_loader('users', '_id').load(user_id)
+    if user:
+        get_loader('users', 'username').prime(user['username'], user)
+    return user
+
+def load_factory(factory_id):
+    return get_loader('factories', '_id').load(factory_id)
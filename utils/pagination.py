@@ -1,17 +1,40 @@
 from flask import request
+from utils.fanout import gather
 
-def paginate(query, filter, page, per_page):
-    total = query.collection.count_documents(filter) 
+def count_items(collection, filter):
+    return lambda session: collection.count_documents(filter, session=session)
+
+def fetch_page(collection, filter, page, per_page, projection=None, sort=None, stages=None):
+    def fetch(session):
+        if stages is not None:
+            # Shape the page in the database with aggregation stages run after the pagination
+            pipeline = [{"$match": filter}]
+            if sort:
+                pipeline.append({"$sort": dict(sort)})
+            pipeline += [{"$skip": (page - 1) * per_page}, {"$limit": per_page}] + stages
+            return list(collection.aggregate(pipeline, session=session))
+        cursor = collection.find(filter, projection, session=session)
+        if sort:
+            cursor = cursor.sort(sort)
+        return list(cursor.skip((page - 1) * per_page).limit(per_page))
+    return fetch
+
+def build_pagination(total, items, page, per_page):
     if per_page > total:
-        per_page = total  
-    items = query.skip((page - 1) * per_page).limit(per_page)
+        per_page = total
     return {
         'total': total,
         'page': page,
         'per_page': per_page,
-        'items': list(items)
+        'items': items
     }
 
+def paginate(collection, filter, page, per_page, projection=None, sort=None, stages=None):
+    # The count and the page query are independent, so they run concurrently
+    total, items = gather(count_items(collection, filter),
+                          fetch_page(collection, filter, page, per_page, projection, sort, stages))
+    return build_pagination(total, items, page, per_page)
+
 def get_pagination_params():
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import random
+import threading
+from collections import Counter
+from flask import g, request, current_app
+
+# Header or query flag an admin can send to profile a single request
+PROFILE_HEADER = 'X-Profile'
+
+class Sampler(threading.Thread):
+    """
+    Sampling profiler collecting the stacks of the threads working for one request
+    as folded stacks, the format read by speedscope and flamegraph.pl. Each stack is
+    rooted at the label of its thread (the request thread or a fan-out worker).
+    """
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.threads = {thread_id: 'request'}
+        self.threads_lock = threading.Lock()
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def add_thread(self, thread_id, label):
+        with self.threads_lock:
+            self.threads[thread_id] = label
+
+    def remove_thread(self, thread_id):
+        with self.threads_lock:
+            self.threads.pop(thread_id, None)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.threads_lock:
+                threads = list(self.threads.items())
+            frames = sys._current_frames()
+            for thread_id, label in threads:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("%s (%s:%d)" % (code.co_name, code.co_filename, code.co_firstlineno))
+                    frame = frame.f_back
+                stack.append(label)
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.items():
+                f.write("%s %d\n" % (stack, count))
+
+def start_profiling():
+    """
+    Start profiling the rest of the current request, if it is not profiled already.
+    """
+    if 'profiler' in g:
+        return
+    interval = current_app.config["PROFILE_INTERVAL_MS"] / 1000.0
+    g.profiler = Sampler(threading.get_ident(), interval)
+    g.profiler.start()
+
+def profiled(task, label='fanout'):
+    """
+    Wrap a task submitted to another thread so that, when the current request is being
+    profiled, the thread running it is sampled too. Must be called in the request thread.
+    """
+    profiler = g.get('profiler')
+    if profiler is None:
+        return task
+
+    def run(*args, **kwargs):
+        thread_id = threading.get_ident()
+        profiler.add_thread(thread_id, label)
+        try:
+            return task(*args, **kwargs)
+        finally:
+            profiler.remove_thread(thread_id)
+    return run
+
+def profiling_requested():
+    return request.headers.get(PROFILE_HEADER) == '1' or request.args.get('profile') == '1'
+
+def init_profiling(app):
+    @app.before_request
+    def sample_request():
+        # Continuous low-overhead profiling of a small fraction of traffic
+        if random.random() < app.config["PROFILE_SAMPLE_RATE"]:
+            start_profiling()
+
+    @app.teardown_request
+    def write_profile(exception=None):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+        profiler.stop()
+        directory = app.config["PROFILE_DIR"]
+        os.makedirs(directory, exist_ok=True)
+        filename = "%d-%s-%d.folded" % (time.time() * 1000, request.endpoint or 'unknown', profiler.ident)
+        profiler.write(os.path.join(directory, filename))
@@ -0,0 +1,94 @@
+import time
+from functools import wraps
+from flask import g, request, current_app, jsonify
+from pymongo.read_preferences import Primary, SecondaryPreferred
+from bson.timestamp import Timestamp
+from bson.raw_bson import RawBSONDocument
+from app import mongo
+
+# Header used to hand the session's operation time back to the client after a write
+# and to receive it again on the next request (read-your-writes across requests)
+OPERATION_TIME_HEADER = 'X-Operation-Time'
+
+# Tolerated clock difference between the app servers and the cluster for client operation times
+OPERATION_TIME_MAX_SKEW = 60
+
+def _build_read_preference(mode):
+    if mode == 'secondaryPreferred':
+        return SecondaryPreferred(max_staleness=current_app.config["MONGO_MAX_STALENESS_SECONDS"])
+    if mode == 'primary':
+        return Primary()
+    raise ValueError("Unsupported read preference: " + mode)
+
+def read_preference(mode):
+    """
+    Route decorator selecting the read preference used by get_collection for this request.
+    Writes are always sent to the primary regardless of the mode.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.read_preference = _build_read_preference(mode)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def get_collection(name, raw=False):
+    """
+    Get a collection bound to the read preference of the current route (primary by default).
+    With raw, documents are returned as RawBSONDocument, holding the bytes sent by the server.
+    """
+    codec_options = mongo.db.codec_options.with_options(document_class=RawBSONDocument) if raw else None
+    return mongo.db.get_collection(name, read_preference=g.get('read_preference', Primary()),
+                                   codec_options=codec_options)
+
+def get_session():
+    """
+    Get the causally consistent session of the current request, advancing it to the
+    operation time sent by the client so reads observe the client's previous writes.
+    """
+    if 'mongo_session' not in g:
+        session = mongo.cx.start_session(causal_consistency=True)
+        operation_time = g.get('client_operation_time')
+        if operation_time is not None:
+            session.advance_operation_time(operation_time)
+        g.mongo_session = session
+    return g.mongo_session
+
+def parse_operation_time(token):
+    """
+    Parse an operation time sent by the client as "<seconds>.<increment>".
+    Raises ValueError for a malformed value or one in the future.
+    """
+    seconds, inc = token.split('.')
+    if not seconds.isdigit() or not inc.isdigit():
+        raise ValueError("Invalid operation time")
+    if int(seconds) > time.time() + OPERATION_TIME_MAX_SKEW:
+        raise ValueError("Operation time in the future")
+    return Timestamp(int(seconds), int(inc))
+
+def init_read_preference(app):
+    @app.before_request
+    def read_operation_time():
+        # Reject bad operation times up front instead of silently losing read-your-writes
+        token = request.headers.get(OPERATION_TIME_HEADER)
+        if token:
+            try:
+                g.client_operation_time = parse_operation_time(token)
+            except ValueError as e:
+                return jsonify({"ok": False, "message": "Invalid " + OPERATION_TIME_HEADER + ": " + str(e)}), 400
+
+    @app.after_request
+    def add_operation_time(response):
+        # Return the latest operation time so the client can send it back on its next read
+        session = g.get('mongo_session')
+        if session is not None and session.operation_time is not None:
+            operation_time = session.operation_time
+            response.headers[OPERATION_TIME_HEADER] = "%d.%d" % (operation_time.time, operation_time.inc)
+        return response
+
+    @app.teardown_request
+    def end_session(exception=None):
+        session = g.pop('mongo_session', None)
+        if session is not None:
+            session.end_session()
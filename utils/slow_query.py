@@ -0,0 +1,130 @@
+import json
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from flask import request
+from pymongo import monitoring
+
+logger = logging.getLogger('slow_query')
+
+# Endpoint of the request issuing the command, copied into fan-out threads by gather
+current_endpoint = contextvars.ContextVar('current_endpoint', default=None)
+
+# Where the filter lives in each explainable command
+FILTER_FIELDS = {
+    'find': lambda command: command.get('filter'),
+    'count': lambda command: command.get('query'),
+    'distinct': lambda command: command.get('query'),
+    'findAndModify': lambda command: command.get('query'),
+    'aggregate': lambda command: next((stage['$match'] for stage in command.get('pipeline', []) if '$match' in stage), None),
+    'update': lambda command: command['updates'][0].get('q') if command.get('updates') else None,
+    'delete': lambda command: command['deletes'][0].get('q') if command.get('deletes') else None,
+}
+
+# Session and transport fields that explain does not accept
+STRIPPED_FIELDS = ('lsid', 'txnNumber', 'readConcern', 'writeConcern', 'startTransaction', 'autocommit')
+
+MAX_TRACKED_SHAPES = 1000
+
+def filter_shape(value):
+    """
+    Redact the values of a filter, keeping its field names and operators.
+    """
+    if isinstance(value, dict):
+        return {key: filter_shape(item) for key, item in value.items()}
+    if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+        return [filter_shape(item) for item in value]
+    return '?'
+
+def _plan_stages(plan):
+    stages = [plan.get('stage')]
+    for child in [plan.get('inputStage'), plan.get('queryPlan')] + plan.get('inputStages', []):
+        if child:
+            stages.extend(_plan_stages(child))
+    return [stage for stage in stages if stage]
+
+def summarize_explain(result):
+    # Aggregations nest the query plan in their first stage
+    if 'stages' in result:
+        result = result['stages'][0].get('$cursor', {})
+    stats = result.get('executionStats', {})
+    return {
+        'stages': _plan_stages(result.get('queryPlanner', {}).get('winningPlan', {})),
+        'n_returned': stats.get('nReturned'),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'execution_ms': stats.get('executionTimeMillis'),
+    }
+
+class SlowQueryListener(monitoring.CommandListener):
+    """
+    Log commands slower than the threshold with their redacted filter shape and explain plan.
+    Each shape is explained and logged at most once per explain interval, repeats are counted.
+    """
+    def __init__(self, threshold_ms, explain_interval):
+        self.threshold_ms = threshold_ms
+        self.explain_interval = explain_interval
+        self.client = None
+        self.pending = {}
+        self.shapes = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='explain')
+
+    def started(self, event):
+        if self.threshold_ms <= 0 or event.command_name not in FILTER_FIELDS:
+            return
+        self.pending[(event.connection_id, event.request_id)] = (event.command, current_endpoint.get())
+
+    def succeeded(self, event):
+        pending = self.pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold_ms * 1000:
+            return
+        command, endpoint = pending
+        shape = filter_shape(FILTER_FIELDS[event.command_name](command) or {})
+        collection = command.get(event.command_name)
+        key = (event.command_name, collection, json.dumps(shape, sort_keys=True))
+
+        # Deduplicate repeated shapes and rate limit their explains
+        now = time.monotonic()
+        with self.lock:
+            last_logged, repeats = self.shapes.get(key, (None, 0))
+            if last_logged is not None and now - last_logged < self.explain_interval:
+                self.shapes[key] = (last_logged, repeats + 1)
+                return
+            if len(self.shapes) >= MAX_TRACKED_SHAPES:
+                self.shapes.clear()
+            self.shapes[key] = (now, 0)
+
+        entry = {
+            'endpoint': endpoint,
+            'command': event.command_name,
+            'database': event.database_name,
+            'collection': collection,
+            'filter': shape,
+            'duration_ms': event.duration_micros / 1000.0,
+            'repeats': repeats,
+        }
+        self.executor.submit(self._explain_and_log, event.database_name, command, entry)
+
+    def failed(self, event):
+        self.pending.pop((event.connection_id, event.request_id), None)
+
+    def _explain_and_log(self, database_name, command, entry):
+        # Explain runs on its own thread so the request never waits for it
+        try:
+            explained = {key: value for key, value in command.items()
+                         if not key.startswith('$') and key not in STRIPPED_FIELDS}
+            result = self.client[database_name].command({'explain': explained, 'verbosity': 'executionStats'})
+            entry['explain'] = summarize_explain(result)
+        except Exception as e:
+            entry['explain_error'] = str(e)
+        logger.warning(json.dumps(entry, default=str))
+
+def init_slow_query_log(app, listener, client):
+    listener.client = client
+
+    @app.before_request
+    def set_current_endpoint():
+        current_endpoint.set(request.endpoint)
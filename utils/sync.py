@@ -0,0 +1,85 @@
+import json
+import base64
+import datetime
+from bson import ObjectId
+from app import mongo
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def record_tombstones(collection, document_ids, factory_id, session=None):
+    """
+    Remember deleted documents so that delta syncs can report them. Written before the delete,
+    so a crash in between only produces a tombstone for a document deleted again on retry.
+    """
+    now = datetime.datetime.utcnow()
+    tombstones = [{
+        "collection": collection,
+        "document_id": document_id,
+        "factory_id": factory_id,
+        "updated_at": now
+    } for document_id in document_ids]
+    if tombstones:
+        mongo.db.tombstones.insert_many(tombstones, session=session)
+
+def record_factory_change(collection, previous, data, session=None):
+    """
+    Leave a tombstone in the former factory of a document moved to another factory by an update,
+    so that the delta syncs of that factory drop it. The new factory sees it through updated_at.
+    """
+    if 'factory_id' in data and data['factory_id'] != previous.get('factory_id'):
+        record_tombstones(collection, [previous['_id']], previous.get('factory_id'), session=session)
+
+def _to_ms(value):
+    return int((value - EPOCH).total_seconds() * 1000)
+
+def _from_ms(value):
+    return EPOCH + datetime.timedelta(milliseconds=value)
+
+def encode_token(position):
+    """
+    Encode the sync positions as an opaque token. Each position is (updated_at, _id) of the last
+    document returned for entities and tombstones, and updated_at of the factory. The token also
+    records the factory it was issued for, since its positions mean nothing for another factory.
+    """
+    payload = {
+        "x": str(position['factory_id']),
+        "e": [_to_ms(position['entities'][0]), str(position['entities'][1])],
+        "t": [_to_ms(position['tombstones'][0]), str(position['tombstones'][1])],
+        "f": _to_ms(position['factory'])
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def decode_token(token):
+    """
+    Decode a sync token, or return the initial position when there is none.
+    factory_id is None for the initial position and for tokens issued before it was recorded.
+    Raises ValueError for a malformed token.
+    """
+    if not token:
+        start = (EPOCH, ObjectId("0" * 24))
+        # The factory is compared with $gt, so start just before documents backfilled at EPOCH
+        return {"entities": start, "tombstones": start, "factory": EPOCH - datetime.timedelta(milliseconds=1),
+                "factory_id": None}
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return {
+            "entities": (_from_ms(payload['e'][0]), ObjectId(payload['e'][1])),
+            "tombstones": (_from_ms(payload['t'][0]), ObjectId(payload['t'][1])),
+            "factory": _from_ms(payload['f']),
+            "factory_id": ObjectId(payload['x']) if 'x' in payload else None
+        }
+    except Exception:
+        raise ValueError("Invalid sync token")
+
+def after(position, horizon):
+    """
+    Filter documents strictly after a (updated_at, _id) position and before the settle horizon.
+    """
+    updated_at, document_id = position
+    return {
+        "$or": [
+            {"updated_at": {"$gt": updated_at}},
+            {"updated_at": updated_at, "_id": {"$gt": document_id}}
+        ],
+        "updated_at": {"$lt": horizon}
+    }
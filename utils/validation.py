@@ -0,0 +1,178 @@
+import re
+import math
+from functools import wraps
+from flask import request, jsonify, current_app
+from werkzeug.exceptions import BadRequest, RequestEntityTooLarge
+
+OBJECT_ID_PATTERN = re.compile(r'^[0-9a-fA-F]{24}$')
+
+# Declarative payload schemas. Every field that is not listed is rejected.
+SCHEMAS = {
+    'register': {
+        'username': {'type': str, 'required': True, 'min_length': 1, 'max_length': 64},
+        'password': {'type': str, 'required': True, 'min_length': 1, 'max_length': 128},
+        'factory_id': {'type': 'object_id', 'required': True},
+    },
+    'adminregister': {
+        'username': {'type': str, 'required': True, 'min_length': 1, 'max_length': 64},
+        'password': {'type': str, 'required': True, 'min_length': 1, 'max_length': 128},
+    },
+    'login': {
+        'username': {'type': str, 'required': True, 'min_length': 1, 'max_length': 64},
+        'password': {'type': str, 'required': True, 'min_length': 1, 'max_length': 128},
+    },
+    'factory_create': {
+        'name': {'type': str, 'required': True, 'min_length': 1, 'max_length': 128},
+        'location': {'type': str, 'required': True, 'min_length': 1, 'max_length': 256},
+        'capacity': {'type': int, 'required': True, 'min': 1},
+        'point': {'type': 'geo_point'},
+    },
+    'factory_update': {
+        'name': {'type': str, 'min_length': 1, 'max_length': 128},
+        'location': {'type': str, 'min_length': 1, 'max_length': 256},
+        'capacity': {'type': int, 'min': 1},
+        'point': {'type': 'geo_point', 'nullable': True},
+    },
+    'entity_create': {
+        'name': {'type': str, 'required': True, 'min_length': 1, 'max_length': 128},
+        'factory_id': {'type': 'object_id', 'required': True},
+    },
+    'entity_update': {
+        'name': {'type': str, 'min_length': 1, 'max_length': 128},
+        'factory_id': {'type': 'object_id'},
+    },
+    'users_reassign': {
+        'from_factory_id': {'type': 'object_id', 'required': True},
+        'to_factory_id': {'type': 'object_id', 'required': True},
+    },
+    'entity_import': {
+        'factory_id': {'type': 'object_id', 'required': True},
+        'names': {'type': list, 'required': True, 'items': str, 'max_length': 10000, 'item_min_length': 1, 'item_max_length': 128},
+    },
+    'telemetry_reading': {
+        'ts': {'type': (int, float), 'required': True, 'finite': True},
+        'metric': {'type': str, 'required': True, 'min_length': 1, 'max_length': 64},
+        'value': {'type': (int, float), 'required': True, 'finite': True},
+    },
+    'user_update': {
+        'username': {'type': str, 'min_length': 1, 'max_length': 64},
+        'factory_id': {'type': 'object_id', 'nullable': True},
+        'is_admin': {'type': bool},
+    },
+}
+
+def is_geo_point(value):
+    if not isinstance(value, dict) or set(value) != {'type', 'coordinates'} or value['type'] != 'Point':
+        return False
+    coordinates = value['coordinates']
+    if not isinstance(coordinates, list) or len(coordinates) != 2:
+        return False
+    if any(not isinstance(c, (int, float)) or isinstance(c, bool) for c in coordinates):
+        return False
+    lng, lat = coordinates
+    return -180 <= lng <= 180 and -90 <= lat <= 90
+
+def _compile_field(name, spec):
+    expected = spec['type']
+    nullable = spec.get('nullable', False)
+    min_length = spec.get('min_length')
+    max_length = spec.get('max_length')
+    minimum = spec.get('min')
+    finite = spec.get('finite', False)
+    items = spec.get('items')
+    item_min_length = spec.get('item_min_length')
+    item_max_length = spec.get('item_max_length')
+    types = expected if isinstance(expected, tuple) else (expected,)
+    type_name = " or ".join(t.__name__ for t in types) if not isinstance(expected, str) else None
+
+    def check(value):
+        if value is None:
+            return None if nullable else name + " must not be null"
+        if expected == 'object_id':
+            if not isinstance(value, str) or not OBJECT_ID_PATTERN.match(value):
+                return "Invalid " + name + " format"
+            return None
+        if expected == 'geo_point':
+            return None if is_geo_point(value) else name + " must be a GeoJSON Point [lng, lat]"
+        # bool is a subclass of int, so it has to be ruled out explicitly
+        if not isinstance(value, types) or (isinstance(value, bool) and bool not in types):
+            return name + " must be of type " + type_name
+        # json.loads accepts NaN and Infinity, which no comparison or aggregation handles
+        if finite and isinstance(value, float) and not math.isfinite(value):
+            return name + " must be a finite number"
+        if minimum is not None and value < minimum:
+            return name + " must be at least " + str(minimum)
+        if min_length is not None and len(value) < min_length:
+            return name + " is too short"
+        if max_length is not None and len(value) > max_length:
+            return name + " is too long"
+        if items is not None:
+            for item in value:
+                if not isinstance(item, items):
+                    return name + " items must be of type " + items.__name__
+                if item_min_length is not None and len(item) < item_min_length:
+                    return name + " items are too short"
+                if item_max_length is not None and len(item) > item_max_length:
+                    return name + " items are too long"
+        return None
+
+    return check
+
+def compile_schema(schema):
+    """
+    Compile a declarative schema into a validator returning an error message or None.
+    """
+    checks = tuple((name, _compile_field(name, spec)) for name, spec in schema.items())
+    allowed = frozenset(schema)
+    required = tuple(name for name, spec in schema.items() if spec.get('required'))
+
+    def validate(data):
+        if not isinstance(data, dict) or not data:
+            return "Missing data"
+        unknown = data.keys() - allowed
+        if unknown:
+            return "Unknown fields: " + ", ".join(sorted(unknown))
+        for name in required:
+            if name not in data or data[name] in ('', None):
+                return "Missing data"
+        for name, check in checks:
+            if name in data:
+                error = check(data[name])
+                if error:
+                    return error
+        return None
+
+    return validate
+
+# Compile every schema once at import time
+VALIDATORS = {name: compile_schema(schema) for name, schema in SCHEMAS.items()}
+
+def validate_json(schema_name, max_content_length=None):
+    """
+    Route decorator validating the JSON body against a compiled schema before the handler runs.
+    max_content_length names a config key overriding MAX_CONTENT_LENGTH for this route.
+    """
+    validator = VALIDATORS[schema_name]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Reject oversized bodies before reading them
+            if max_content_length is not None:
+                request.max_content_length = current_app.config[max_content_length]
+            max_length = request.max_content_length
+            if request.content_length is not None and request.content_length > max_length:
+                return jsonify({"ok": False, "message": "Payload too large"}), 413
+            try:
+                data = request.get_json(silent=True)
+            except RequestEntityTooLarge:
+                return jsonify({"ok": False, "message": "Payload too large"}), 413
+            except BadRequest:
+                data = None
+
+            error = validator(data)
+            if error:
+                return jsonify({"ok": False, "message": error}), 400
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
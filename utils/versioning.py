@@ -0,0 +1,40 @@
+from flask import request
+from pymongo import ReturnDocument
+
+def etag_header(document):
+    return {"ETag": '"%d"' % document.get('version', 0)}
+
+def get_expected_versions():
+    """
+    Get the document versions accepted by the If-Match header, or None when any version is accepted.
+    If-Match uses the strong comparison, so weak tags never match.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    versions = []
+    for tag in request.if_match.as_set():
+        # Malformed tags never match, so a header without a valid tag fails with 412
+        if tag.isascii() and tag.isdigit():
+            versions.append(int(tag))
+    return versions
+
+def conditional_update(collection, filter, data, session=None, previous=False):
+    """
+    Apply $set, bump the version and refresh updated_at in a single round trip, only if the document
+    matches the filter and the If-Match version. Returns the updated document, or None when nothing matched.
+    With previous, the document as it was before the update is returned instead.
+    """
+    filter = dict(filter)
+    versions = get_expected_versions()
+    if versions is not None:
+        # Documents created before versioning have no version field and count as version 0
+        if 0 in versions:
+            versions.append(None)
+        filter['version'] = {"$in": versions}
+    return collection.find_one_and_update(
+        filter,
+        # updated_at comes from the database clock, so updates from different app servers are ordered
+        {"$set": data, "$currentDate": {"updated_at": True}, "$inc": {"version": 1}},
+        return_document=ReturnDocument.BEFORE if previous else ReturnDocument.AFTER,
+        session=session
+    )
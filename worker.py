@@ -0,0 +1,8 @@
+import logging
+from app import create_app
+from utils.jobs import run_worker
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    create_app()
+    run_worker()
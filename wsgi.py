@@ -0,0 +1,10 @@
+import os
+
+# gevent has to patch the standard library before pymongo is imported
+if os.getenv("WORKER_CLASS", "gthread") == "gevent":
+    from gevent import monkey
+    monkey.patch_all()
+
+from app import create_app
+
+application = create_app()